@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django import forms
-from .models import User, Todo, ActivityLog
+from .models import User, Todo, ActivityLog, ActivityRollup, EmailOutbox
 
 class UserCreationForm(forms.ModelForm):
     class Meta:
@@ -53,4 +53,19 @@ class ActivityLogAdmin(admin.ModelAdmin):
     search_fields = ('admin__email', 'admin__first_name', 'admin__last_name', 
                     'user__email', 'user__first_name', 'user__last_name')
     readonly_fields = ('admin', 'user', 'action', 'details', 'created_at')
+    ordering = ('-created_at',)
+
+@admin.register(ActivityRollup)
+class ActivityRollupAdmin(admin.ModelAdmin):
+    list_display = ('day', 'action', 'actor_id', 'target_id', 'count')
+    list_filter = ('action',)
+    readonly_fields = ('day', 'action', 'actor_id', 'target_id', 'count')
+    ordering = ('-day', 'action')
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'user', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject', 'user__email')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
     ordering = ('-created_at',)
\ No newline at end of file
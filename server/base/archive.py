@@ -0,0 +1,207 @@
+"""
+Cold storage for old activity logs.
+
+The ActivityLog table holds the hot, interactively queried part of the
+audit history (ACTIVITY_LOG_HOT_RETENTION_DAYS). The archive_activity_logs
+command moves whole months older than that into ACTIVITY_LOG_ARCHIVE_DIR:
+
+    2025-01.part-001.ndjson.gz   one JSON object per entry, oldest first
+    index.json                   month, id/time range, row count and sha256
+                                 of every part
+
+Parts are written once and made read-only. A month that receives more rows
+after it was archived gets another part, never a rewrite. query() reads the
+parts overlapping a time range on demand.
+"""
+import gzip
+import hashlib
+import heapq
+import json
+import os
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from .counts import invalidate_counts
+from .models import ActivityLog
+
+INDEX_FILE = 'index.json'
+
+def archive_dir():
+    return Path(settings.ACTIVITY_LOG_ARCHIVE_DIR)
+
+def load_index():
+    path = archive_dir() / INDEX_FILE
+    if not path.exists():
+        return []
+    return json.loads(path.read_text())['parts']
+
+def save_index(parts):
+    path = archive_dir() / INDEX_FILE
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps({'parts': parts}, indent=2))
+    os.replace(tmp, path)
+
+def month_bounds(month):
+    start = month.replace(day=1, hour=0, minute=0, second=0, microsecond=0, tzinfo=dt_timezone.utc)
+    if start.month == 12:
+        return start, start.replace(year=start.year + 1, month=1)
+    return start, start.replace(month=start.month + 1)
+
+def person(user):
+    if user is None:
+        return None
+    return {
+        'id': user.id,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+    }
+
+def serialize(log):
+    # Users are embedded so the archive still reads correctly after they
+    # are deleted from the hot database
+    return {
+        'id': log.id,
+        'admin': person(log.admin),
+        'user': person(log.user),
+        'action': log.action,
+        'details': log.details,
+        'created_at': log.created_at.isoformat(),
+    }
+
+def write_part(start, end, after_id):
+    """
+    Write the hot rows of one month with id > ``after_id`` to a new part
+    file and return its index entry, or None when there are none.
+    """
+    directory = archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    key = start.strftime('%Y-%m')
+    number = 1 + sum(1 for part in load_index() if part['month'] == key)
+    name = f'{key}.part-{number:03d}.ndjson.gz'
+    tmp = directory / f'{name}.tmp'
+
+    logs = (
+        ActivityLog.objects.select_related('admin', 'user')
+        .filter(created_at__gte=start, created_at__lt=end, id__gt=after_id)
+        .order_by('id')
+    )
+    rows = 0
+    first_id = last_id = None
+    with gzip.open(tmp, 'wt', encoding='utf-8') as out:
+        for log in logs.iterator(chunk_size=2000):
+            out.write(json.dumps(serialize(log), separators=(',', ':')))
+            out.write('\n')
+            rows += 1
+            first_id = log.id if first_id is None else first_id
+            last_id = log.id
+
+    if not rows:
+        tmp.unlink()
+        return None
+
+    digest = hashlib.sha256()
+    with open(tmp, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+        os.fsync(f.fileno())
+    path = directory / name
+    os.replace(tmp, path)
+    path.chmod(0o444)
+
+    return {
+        'file': name,
+        'month': key,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'first_id': first_id,
+        'last_id': last_id,
+        'rows': rows,
+        'sha256': digest.hexdigest(),
+    }
+
+def delete_archived(start, end, last_id, batch_size):
+    """
+    Delete the hot rows of a month that its parts already hold: every row
+    in the month with id <= ``last_id`` existed when the part was written.
+    """
+    deleted = 0
+    while True:
+        ids = list(
+            ActivityLog.objects.filter(created_at__gte=start, created_at__lt=end, id__lte=last_id)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            ActivityLog.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+def archive_before(cutoff, batch_size=1000):
+    """
+    Move every month that ended before ``cutoff`` to the archive and return
+    (parts written, rows deleted).
+    """
+    cutoff_month, _ = month_bounds(cutoff)
+    months = ActivityLog.objects.filter(created_at__lt=cutoff_month).dates('created_at', 'month')
+    written = []
+    deleted = 0
+    for month in months:
+        start, end = month_bounds(datetime(month.year, month.month, 1))
+        key = start.strftime('%Y-%m')
+        # Rows a previous run archived but did not get to delete
+        archived_to = max((p['last_id'] for p in load_index() if p['month'] == key), default=0)
+        deleted += delete_archived(start, end, archived_to, batch_size)
+
+        part = write_part(start, end, archived_to)
+        if part is None:
+            continue
+        save_index(load_index() + [part])
+        written.append(part)
+        deleted += delete_archived(start, end, part['last_id'], batch_size)
+    if deleted:
+        invalidate_counts()
+    return written, deleted
+
+def read_part(part):
+    with gzip.open(archive_dir() / part['file'], 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+def query(start, end, action=None, user_id=None, admin_id=None, limit=100):
+    """
+    Return (entries, matched) for archived entries with start <= created_at
+    < end matching the filters, newest first, at most ``limit`` of them.
+    """
+    def matches(entry, created_at):
+        if not start <= created_at < end:
+            return False
+        if action and entry['action'] != action:
+            return False
+        if user_id and (entry['user'] or {}).get('id') != user_id:
+            return False
+        if admin_id and (entry['admin'] or {}).get('id') != admin_id:
+            return False
+        return True
+
+    parts = [
+        part for part in load_index()
+        if parse_datetime(part['start']) < end and parse_datetime(part['end']) > start
+    ]
+    matched = 0
+    newest = []
+    for part in parts:
+        for entry in read_part(part):
+            created_at = parse_datetime(entry['created_at'])
+            if matches(entry, created_at):
+                matched += 1
+                item = (created_at, entry['id'], entry)
+                if len(newest) < limit:
+                    heapq.heappush(newest, item)
+                else:
+                    heapq.heappushpop(newest, item)
+    return [item[2] for item in sorted(newest, key=lambda item: item[:2], reverse=True)], matched
@@ -0,0 +1,128 @@
+"""
+Buffered ActivityLog writer.
+
+Log entries are queued in process and inserted with one ``bulk_create`` when
+ACTIVITY_LOG_BATCH_SIZE entries are waiting or ACTIVITY_LOG_FLUSH_SECONDS
+have passed, by a background thread, and once more when the process exits.
+Entries that must be on disk before the request returns are written with
+``durable=True``; ACTIVITY_LOG_BUFFERED=False writes every entry that way.
+
+A hard crash loses at most the entries still waiting in the buffer.
+"""
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.dispatch import Signal
+
+from .metrics import record_count
+
+logger = logging.getLogger(__name__)
+
+# Sent with ``entries`` (the saved ActivityLog instances) after every insert
+activity_logs_written = Signal()
+
+class AuditWriter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pending = []
+        self.thread = None
+        self.pid = None
+
+    def write(self, entry, durable=False):
+        if durable or not settings.ACTIVITY_LOG_BUFFERED:
+            self.save([entry])
+            return entry
+
+        with self.lock:
+            self.ensure_thread()
+            self.pending.append(entry)
+            full = len(self.pending) >= settings.ACTIVITY_LOG_BATCH_SIZE
+        if full:
+            self.wakeup.set()
+        return entry
+
+    def ensure_thread(self):
+        # Started lazily so that each forked worker gets its own thread
+        # and buffer, rather than inheriting the parent's.
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.pending = []
+            self.thread = None
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.run, name='activity-log-writer', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            self.flush_when_due()
+
+    def flush_when_due(self):
+        """
+        Wait until the buffer is full or ACTIVITY_LOG_FLUSH_SECONDS have
+        passed, then flush it.
+        """
+        self.wakeup.wait(settings.ACTIVITY_LOG_FLUSH_SECONDS)
+        self.wakeup.clear()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Failed to flush activity log buffer")
+        finally:
+            close_old_connections()
+
+    def flush(self):
+        """
+        Write every queued entry now and return how many were written.
+        """
+        with self.lock:
+            entries, self.pending = self.pending, []
+        if entries:
+            self.save(entries)
+        return len(entries)
+
+    def save(self, entries):
+        from .models import ActivityLog
+
+        for entry in entries:
+            entry.populate_derived_fields()
+        try:
+            with transaction.atomic():
+                ActivityLog.objects.bulk_create(entries)
+        except IntegrityError:
+            # Most likely a user deleted while their entry sat in the
+            # buffer; save one by one so the rest of the batch survives.
+            for entry in entries:
+                self.save_one(entry)
+        record_count('activity_log_written', len(entries))
+        activity_logs_written.send(sender=ActivityLog, entries=entries)
+
+    def save_one(self, entry):
+        from .models import User
+
+        entry.pk = None
+        try:
+            with transaction.atomic():
+                entry.save(force_insert=True)
+        except IntegrityError:
+            existing = set(User.objects.filter(
+                pk__in=[entry.admin_id, entry.user_id]
+            ).values_list('pk', flat=True))
+            if entry.admin_id not in existing:
+                entry.admin = None
+            if entry.user_id not in existing:
+                entry.user = None
+            entry.save(force_insert=True)
+
+writer = AuditWriter()
+
+@atexit.register
+def flush_on_exit():
+    try:
+        writer.flush()
+    except Exception:
+        logger.exception("Failed to flush activity log buffer at exit")
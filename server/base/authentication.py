@@ -1,9 +1,75 @@
+import time
+
+from .caches import is_shared_cache
 from .models import User
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework.exceptions import AuthenticationFailed
 from django.conf import settings
+from django.core.cache import cache
+from django.db import router
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 
+AUTH_VERSION_KEY = 'auth:version:{user_id}'
+AUTH_USER_KEY = 'auth:user:{user_id}:{version}'
+
+# Everything but the password hash, which stays out of the shared cache; a
+# cached user reads it from the database when first accessed
+CACHED_USER_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields if field.attname != 'password'
+)
+
+def get_auth_version(user_id):
+    key = AUTH_VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a lost counter can never point back at
+        # identities cached under an older version.
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+def bump_auth_version(user_id):
+    """
+    Invalidate every cached identity of a user. Call after any change that
+    must be visible to the next request (status, role, password, deletion).
+    """
+    key = AUTH_VERSION_KEY.format(user_id=user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, timeout=None)
+        return version
+
+def get_cached_user(user_id, load=None):
+    """
+    Return the user cached under its current auth version, calling ``load``
+    (default: a primary-key lookup) on a miss.
+
+    With a process-local cache a bump_auth_version() would only reach the
+    worker that made it, so the user is read from the database every time.
+    """
+    if not is_shared_cache():
+        if load:
+            return load()
+        return User.objects.filter(pk=user_id).first()
+
+    key = AUTH_USER_KEY.format(user_id=user_id, version=get_auth_version(user_id))
+    row = cache.get(key)
+    if row is None:
+        if load:
+            user = load()
+            row = {field: getattr(user, field) for field in CACHED_USER_FIELDS} if user is not None else None
+        else:
+            row = User.objects.filter(pk=user_id).values(*CACHED_USER_FIELDS).first()
+        if row is None:
+            return None
+        cache.set(key, row, settings.AUTH_USER_CACHE_TIMEOUT)
+    # As if loaded with defer('password'); save() writes the loaded fields only
+    return User.from_db(router.db_for_read(User), list(row), list(row.values()))
+
 class CookiesJWTAuthentication(JWTAuthentication):
     def authenticate(self, request):
         # Try to get token from cookie first
@@ -36,4 +102,11 @@ class CookiesJWTAuthentication(JWTAuthentication):
             raise
         except Exception as e:
             # Catch any other unexpected errors
-            raise AuthenticationFailed('Authentication failed', code='authentication_failed')
\ No newline at end of file
+            raise AuthenticationFailed('Authentication failed', code='authentication_failed')
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        return get_cached_user(user_id, lambda: super(CookiesJWTAuthentication, self).get_user(validated_token))
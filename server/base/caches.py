@@ -0,0 +1,14 @@
+"""
+Which caches every server process shares.
+
+Cached state that another worker must see, such as an invalidation, only
+works in a cache shared by all the processes (Redis, Memcached, the
+database, or files on a single host). LocMemCache lives inside one process
+and DummyCache stores nothing.
+"""
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+def is_shared_cache(alias='default'):
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
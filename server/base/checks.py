@@ -0,0 +1,21 @@
+from django.core.checks import Error, register
+
+from .caches import is_shared_cache
+from .throttling import THROTTLE_CACHE
+
+@register()
+def check_throttle_cache(app_configs, **kwargs):
+    """
+    Rate limits counted in a process-local cache multiply with the number of
+    worker processes.
+    """
+    if is_shared_cache(THROTTLE_CACHE):
+        return []
+    return [Error(
+        f"CACHES['{THROTTLE_CACHE}'] is not shared between server processes.",
+        hint=(
+            "Use the database cache (the default) or Redis/Memcached through "
+            "THROTTLE_CACHE_BACKEND and THROTTLE_CACHE_LOCATION."
+        ),
+        id='base.E001',
+    )]
@@ -0,0 +1,102 @@
+"""
+Row counts for the activity log listing without a COUNT(*) per page.
+
+Exact counts are cached per filter signature for
+ACTIVITY_LOG_COUNT_CACHE_SECONDS. Every cached count hangs off a generation
+number that the audit writer bumps whenever it stores entries, so a new
+entry is never missing from a count for longer than that.
+
+Counts that would touch more than ACTIVITY_LOG_COUNT_ESTIMATE_THRESHOLD rows
+are estimated instead: the unfiltered listing from table statistics, a
+search by counting at most the threshold number of matches.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Max, Min
+from django.dispatch import receiver
+
+from .audit import activity_logs_written
+
+GENERATION_KEY = 'activitylog:count:generation'
+COUNT_KEY = 'activitylog:count:{generation}:{signature}'
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, timeout=None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+def invalidate_counts():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, timeout=None)
+
+@receiver(activity_logs_written)
+def activity_logs_written_handler(sender, entries, **kwargs):
+    invalidate_counts()
+
+def signature(filters):
+    normalized = {
+        key: str(value).strip().lower()
+        for key, value in filters.items()
+        if value not in (None, '')
+    }
+    return hashlib.sha1(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+def table_estimate(queryset):
+    """
+    Approximate row count of the whole table from database statistics,
+    without scanning it.
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return row[0]
+    # Both ends of the primary key are index lookups; gaps left by
+    # deleted or archived rows make this an upper bound.
+    bounds = queryset.model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['high'] is None:
+        return 0
+    return bounds['high'] - bounds['low'] + 1
+
+def bounded_count(queryset, limit):
+    """
+    Count at most ``limit`` + 1 rows, so the cost is capped however many
+    rows match.
+    """
+    return queryset.order_by().values('pk')[:limit + 1].count()
+
+def count_logs(queryset, filters, exact=False):
+    """
+    Return (count, estimated) for the filtered activity log ``queryset``.
+    ``filters`` are the request filters that produced it.
+    """
+    key = COUNT_KEY.format(generation=get_generation(), signature=signature({**filters, 'exact': exact}))
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    threshold = settings.ACTIVITY_LOG_COUNT_ESTIMATE_THRESHOLD
+    result = None
+    if not exact and not any(filters.values()):
+        estimate = table_estimate(queryset)
+        if estimate > threshold:
+            result = (estimate, True)
+    elif not exact and filters.get('search'):
+        count = bounded_count(queryset, threshold)
+        result = (count, count > threshold)
+
+    if result is None:
+        result = (queryset.count(), False)
+    cache.set(key, result, settings.ACTIVITY_LOG_COUNT_CACHE_SECONDS)
+    return result
@@ -0,0 +1,95 @@
+"""
+Full-text search over ActivityLog.search_document.
+
+The document (actor and target names and emails plus the flattened details)
+is built when an entry is written. It is indexed according to the database:
+
+    sqlite      an FTS5 table kept in sync by triggers, ranked with bm25()
+    postgresql  a GIN index on to_tsvector('simple', search_document)
+    other       a plain icontains on the column
+
+The index itself is created by migration 0009.
+"""
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Value
+
+FTS_TABLE = 'base_activitylog_fts'
+SEARCH_CONFIG = 'simple'
+
+def flatten(value):
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from flatten(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from flatten(item)
+    elif value is not None and not isinstance(value, bool):
+        yield str(value)
+
+def build_search_document(admin, user, details):
+    parts = []
+    for person in (admin, user):
+        if person is not None:
+            parts += [person.first_name, person.last_name, person.email]
+    parts += flatten(details or {})
+    return ' '.join(part for part in parts if part)
+
+def fts5_query(text):
+    """
+    Turn user input into an FTS5 query that cannot raise a syntax error:
+    every whitespace separated term becomes a quoted prefix phrase of its
+    word characters, so 'jane@exa' matches the tokens 'jane' 'exa...'.
+    """
+    phrases = []
+    for term in text.split():
+        words = re.findall(r'\w+', term)
+        if words:
+            phrases.append('"{}"*'.format(' '.join(words)))
+    return ' '.join(phrases)
+
+_fts5_tables = {}
+
+def has_fts5_table(connection, table=FTS_TABLE):
+    key = (connection.alias, table)
+    if key not in _fts5_tables:
+        _fts5_tables[key] = table in connection.introspection.table_names()
+    return _fts5_tables[key]
+
+def search(queryset, text):
+    """
+    Filter ``queryset`` to entries matching ``text``, annotated with
+    ``search_rank`` (higher is better; constant where the backend cannot
+    rank).
+    """
+    connection = connections[queryset.db]
+
+    if connection.vendor == 'sqlite' and has_fts5_table(connection):
+        query = fts5_query(text)
+        if not query:
+            return unranked(queryset.none())
+        table = queryset.model._meta.db_table
+        # A join with the FTS table rather than an IN subquery, so that
+        # bm25() can be read for each matching row.
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[query],
+            # bm25() is lower for better matches
+            select={'search_rank': f'-bm25({FTS_TABLE})'},
+        )
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+        vector = SearchVector('search_document', config=SEARCH_CONFIG)
+        return queryset.annotate(search_vector=vector).filter(search_vector=query).annotate(
+            search_rank=SearchRank(vector, query)
+        )
+
+    return unranked(queryset.filter(search_document__icontains=text))
+
+def unranked(queryset):
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, ScryptPasswordHasher
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with the iteration count taken from settings. It keeps Django's
+    algorithm name, so existing hashes still verify and are re-encoded with
+    the configured count on the user's next successful login.
+    """
+
+    iterations = settings.PASSWORD_PBKDF2_ITERATIONS or PBKDF2PasswordHasher.iterations
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """
+    Standard-library scrypt with the work factor taken from settings.
+    """
+
+    work_factor = settings.PASSWORD_SCRYPT_WORK_FACTOR or ScryptPasswordHasher.work_factor
+    # scrypt needs about 128 * n * r bytes; OpenSSL's default cap is 32 MiB
+    maxmem = 256 * work_factor * ScryptPasswordHasher.block_size
@@ -0,0 +1,144 @@
+"""
+Asymmetric JWT signing with a rotating key ring.
+
+With ``JWT_ALGORITHM`` set to RS256 or EdDSA, tokens are signed with the
+private key named by ``JWT_ACTIVE_KID`` and carry that id in their ``kid``
+header. Every key in ``JWT_KEYS_DIR`` can verify tokens:
+
+    <kid>.pem      private key, may sign and verify
+    <kid>.pub.pem  public key only, verifies tokens signed before a rotation
+
+Each key verifies with the algorithm matching its type (RSA keys RS256,
+Ed25519 keys EdDSA), so a ring can span a switch between the two. Other
+services verify tokens locally using the public keys published at the JWKS
+endpoint. With an HS* algorithm (the default), simplejwt's own backend
+and SECRET_KEY are used unchanged.
+"""
+from functools import lru_cache
+from pathlib import Path
+
+import jwt
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError, TokenBackendExpiredToken
+from rest_framework_simplejwt.settings import api_settings
+
+PRIVATE_SUFFIX = '.pem'
+PUBLIC_SUFFIX = '.pub.pem'
+
+def key_algorithm(public_key):
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+
+    return 'EdDSA' if isinstance(public_key, ed25519.Ed25519PublicKey) else 'RS256'
+
+def is_asymmetric():
+    return not api_settings.ALGORITHM.startswith('HS')
+
+def load_key_ring(keys_dir):
+    """
+    Return ({kid: private_key}, {kid: public_key}) for the PEM files in
+    ``keys_dir``.
+    """
+    from cryptography.hazmat.primitives import serialization
+
+    private_keys = {}
+    public_keys = {}
+    for path in sorted(Path(keys_dir).glob('*.pem')):
+        data = path.read_bytes()
+        if path.name.endswith(PUBLIC_SUFFIX):
+            kid = path.name[:-len(PUBLIC_SUFFIX)]
+            public_keys.setdefault(kid, serialization.load_pem_public_key(data))
+        else:
+            kid = path.name[:-len(PRIVATE_SUFFIX)]
+            private_keys[kid] = serialization.load_pem_private_key(data, password=None)
+            public_keys[kid] = private_keys[kid].public_key()
+    return private_keys, public_keys
+
+class KeyRingTokenBackend(TokenBackend):
+    def __init__(self, algorithm, private_keys, public_keys, active_kid, **kwargs):
+        super().__init__(algorithm, **kwargs)
+        if active_kid not in private_keys:
+            raise ImproperlyConfigured(
+                f"JWT_ACTIVE_KID '{active_kid}' has no private key in JWT_KEYS_DIR"
+            )
+        if key_algorithm(public_keys[active_kid]) != algorithm:
+            raise ImproperlyConfigured(
+                f"JWT_ACTIVE_KID '{active_kid}' is not a {algorithm} key"
+            )
+        self.private_keys = private_keys
+        self.public_keys = public_keys
+        self.active_kid = active_kid
+
+    def encode(self, payload):
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload['aud'] = self.audience
+        if self.issuer is not None:
+            jwt_payload['iss'] = self.issuer
+
+        return jwt.encode(
+            jwt_payload,
+            self.private_keys[self.active_kid],
+            algorithm=self.algorithm,
+            headers={'kid': self.active_kid},
+            json_encoder=self.json_encoder,
+        )
+
+    def get_verifying_key(self, token):
+        try:
+            kid = jwt.get_unverified_header(token).get('kid')
+        except jwt.InvalidTokenError as ex:
+            raise TokenBackendError('Token is invalid') from ex
+        if kid not in self.public_keys:
+            raise TokenBackendError('Token is invalid')
+        return self.public_keys[kid]
+
+    def decode(self, token, verify=True):
+        key = self.get_verifying_key(token)
+        try:
+            return jwt.decode(
+                token,
+                key,
+                algorithms=[key_algorithm(key)],
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.get_leeway(),
+                options={
+                    'verify_aud': self.audience is not None,
+                    'verify_signature': verify,
+                },
+            )
+        except jwt.ExpiredSignatureError as ex:
+            raise TokenBackendExpiredToken('Token is expired') from ex
+        except jwt.InvalidTokenError as ex:
+            raise TokenBackendError('Token is invalid') from ex
+
+    def get_jwks(self):
+        keys = []
+        for kid, key in self.public_keys.items():
+            algorithm = key_algorithm(key)
+            if algorithm == 'EdDSA':
+                jwk = jwt.algorithms.OKPAlgorithm.to_jwk(key, as_dict=True)
+            else:
+                jwk = jwt.algorithms.RSAAlgorithm.to_jwk(key, as_dict=True)
+            keys.append({**jwk, 'kid': kid, 'alg': algorithm, 'use': 'sig'})
+        return {'keys': keys}
+
+@lru_cache(maxsize=None)
+def get_token_backend():
+    if not is_asymmetric():
+        from rest_framework_simplejwt.state import token_backend
+        return token_backend
+
+    private_keys, public_keys = load_key_ring(settings.JWT_KEYS_DIR)
+    return KeyRingTokenBackend(
+        api_settings.ALGORITHM,
+        private_keys,
+        public_keys,
+        settings.JWT_ACTIVE_KID,
+        audience=api_settings.AUDIENCE,
+        issuer=api_settings.ISSUER,
+        leeway=api_settings.LEEWAY,
+        json_encoder=api_settings.JSON_ENCODER,
+    )
@@ -0,0 +1,215 @@
+"""
+Live activity feed brokers.
+
+The activity feed view streams new ActivityLog entries to administrators
+as server-sent events. Entries reach it through the broker named by
+ACTIVITY_FEED_BROKER:
+
+    DatabaseBroker   every client polls the table for ids after the last
+                     one it saw; works across nodes and processes (default)
+    InProcessBroker  the audit writer hands entries straight to the
+                     connected clients of the same process. Single process
+                     only: with several workers a client never sees what
+                     the others write until it reconnects.
+
+Both replay what a client missed when it reconnects with its last id.
+
+Ids are allocated when a row is inserted but become visible when its
+transaction commits, so a lower id can show up after a higher one has been
+sent. Each client keeps reading from below the ids it was sent in the last
+ACTIVITY_FEED_OVERLAP_SECONDS and skips those it already has (SentWindow).
+"""
+import asyncio
+import threading
+import time
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .archive import person
+from .audit import activity_logs_written
+from .models import ActivityLog
+
+REPLAY_BATCH_SIZE = 500
+
+def to_event(log):
+    return {
+        'id': log.id,
+        'action': log.action,
+        'action_display': log.get_action_display(),
+        'admin': person(log.admin),
+        'user': person(log.user),
+        'details': log.details,
+        'created_at': log.created_at.isoformat(),
+    }
+
+def matches(event, filters):
+    if filters.get('actions') and event['action'] not in filters['actions']:
+        return False
+    if filters.get('user_id') and (event['user'] or {}).get('id') != filters['user_id']:
+        return False
+    if filters.get('admin_id') and (event['admin'] or {}).get('id') != filters['admin_id']:
+        return False
+    return True
+
+def load_events(filters, after_id, limit=REPLAY_BATCH_SIZE):
+    logs = ActivityLog.objects.select_related('admin', 'user').filter(id__gt=after_id)
+    if filters.get('actions'):
+        logs = logs.filter(action__in=filters['actions'])
+    if filters.get('user_id'):
+        logs = logs.filter(user_id=filters['user_id'])
+    if filters.get('admin_id'):
+        logs = logs.filter(admin_id=filters['admin_id'])
+    return [to_event(log) for log in logs.order_by('id')[:limit]]
+
+def latest_id():
+    return ActivityLog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+async def replay(filters, after_id):
+    """
+    Yield every stored event after ``after_id``, in batches.
+    """
+    while True:
+        events = await sync_to_async(load_events)(filters, after_id)
+        for event in events:
+            yield event
+            after_id = event['id']
+        if len(events) < REPLAY_BATCH_SIZE:
+            return
+
+class SentWindow:
+    """
+    The ids sent to one client in the last ACTIVITY_FEED_OVERLAP_SECONDS.
+    Reading after ``floor``, the highest id sent before that, finds the rows
+    that committed late; add() tells which of them are new.
+    """
+
+    def __init__(self, floor):
+        self.floor = floor
+        self.recent = {}
+
+    def add(self, event_id):
+        if event_id <= self.floor or event_id in self.recent:
+            return False
+        self.recent[event_id] = time.monotonic()
+        return True
+
+    def expire(self):
+        cutoff = time.monotonic() - settings.ACTIVITY_FEED_OVERLAP_SECONDS
+        for event_id, sent in list(self.recent.items()):
+            if sent < cutoff:
+                del self.recent[event_id]
+                self.floor = max(self.floor, event_id)
+
+class Subscription:
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=settings.ACTIVITY_FEED_QUEUE_SIZE)
+        self.lagged = False
+
+    def deliver(self, events):
+        # Runs on the subscriber's event loop
+        try:
+            self.queue.put_nowait(events)
+        except asyncio.QueueFull:
+            # Too slow to keep up; it catches up from the database instead
+            self.lagged = True
+
+class InProcessBroker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = set()
+
+    def publish(self, entries):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        if not subscriptions:
+            return
+        events = [to_event(entry) for entry in entries]
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, events)
+            except RuntimeError:
+                # Its event loop has closed
+                self.unsubscribe(subscription)
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    async def listen(self, filters, last_id=None):
+        """
+        Yield events matching ``filters`` as they are written, starting
+        with any stored after ``last_id``. Yields None as a heartbeat when
+        nothing happened for ACTIVITY_FEED_HEARTBEAT_SECONDS.
+        """
+        subscription = Subscription(asyncio.get_running_loop())
+        with self.lock:
+            self.subscriptions.add(subscription)
+        try:
+            # Subscribed before reading, so nothing written in between is lost
+            if last_id is None:
+                last_id = await sync_to_async(latest_id)()
+            sent = SentWindow(last_id)
+            async for event in replay(filters, sent.floor):
+                if sent.add(event['id']):
+                    yield event
+
+            while True:
+                sent.expire()
+                if subscription.lagged:
+                    subscription.lagged = False
+                    while not subscription.queue.empty():
+                        subscription.queue.get_nowait()
+                    async for event in replay(filters, sent.floor):
+                        if sent.add(event['id']):
+                            yield event
+                try:
+                    events = await asyncio.wait_for(
+                        subscription.queue.get(), settings.ACTIVITY_FEED_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                for event in events:
+                    if matches(event, filters) and sent.add(event['id']):
+                        yield event
+        finally:
+            self.unsubscribe(subscription)
+
+class DatabaseBroker:
+    def publish(self, entries):
+        # Clients read the table themselves
+        pass
+
+    async def listen(self, filters, last_id=None):
+        if last_id is None:
+            last_id = await sync_to_async(latest_id)()
+        sent = SentWindow(last_id)
+        idle = 0
+        while True:
+            found = False
+            async for event in replay(filters, sent.floor):
+                if sent.add(event['id']):
+                    found = True
+                    yield event
+            sent.expire()
+            if found:
+                idle = 0
+                continue
+            await asyncio.sleep(settings.ACTIVITY_FEED_POLL_SECONDS)
+            idle += settings.ACTIVITY_FEED_POLL_SECONDS
+            if idle >= settings.ACTIVITY_FEED_HEARTBEAT_SECONDS:
+                idle = 0
+                yield None
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.ACTIVITY_FEED_BROKER)()
+
+@receiver(activity_logs_written)
+def activity_logs_written_handler(sender, entries, **kwargs):
+    get_broker().publish(entries)
@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def scratch_database(on_disk=False):
+    """
+    Run a benchmark against a throwaway copy of the schema, the same way the
+    test runner does, so timings never touch real accounts or audit history.
+
+    SQLite test databases live in memory; ``on_disk`` puts the copy in a
+    temporary file instead, so concurrent writers contend for the file lock
+    the way they do in production.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    scratch_dir = None
+    if on_disk and connection.vendor == 'sqlite':
+        scratch_dir = tempfile.mkdtemp()
+        test_settings['NAME'] = os.path.join(scratch_dir, 'benchmark.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = old_test_name
+        if scratch_dir:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+def best_of(func, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base.archive import archive_before, archive_dir
+
+
+class Command(BaseCommand):
+    help = (
+        "Move activity logs from months that ended more than "
+        "ACTIVITY_LOG_HOT_RETENTION_DAYS ago into gzip NDJSON archive files. "
+        "Run it periodically from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.ACTIVITY_LOG_HOT_RETENTION_DAYS,
+            help='Days of history to keep in the database',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per batch')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        parts, deleted = archive_before(cutoff, options['batch_size'])
+
+        for part in parts:
+            self.stdout.write(f"  {part['file']}: {part['rows']} entries")
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {sum(part['rows'] for part in parts)} activity logs to {archive_dir()}, "
+            f"removed {deleted} from the database"
+        ))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from base.models import ActivityLog
+
+COLUMNS = ['ip_address', 'target_email', 'reset_by_admin']
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill ActivityLog.ip_address, target_email and reset_by_admin from "
+        "details for entries written before those columns existed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Entries updated per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        checked = 0
+        updated = 0
+        last_id = 0
+
+        # Walks the primary key in batches, so each batch is a short
+        # transaction and an interrupted run can simply be started again
+        while True:
+            rows = list(
+                ActivityLog.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'details', *COLUMNS)[:batch_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            checked += len(rows)
+
+            changed = []
+            for id, details, *current in rows:
+                columns = ActivityLog.detail_columns(details)
+                if [columns[field] for field in COLUMNS] != current:
+                    changed.append(ActivityLog(id=id, **columns))
+            if changed:
+                ActivityLog.objects.bulk_update(changed, COLUMNS)
+                updated += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} activity logs, updated {updated}"))
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from base.authentication import bump_auth_version
+from base.models import User
+
+
+class Command(BaseCommand):
+    help = "Recompute User.using_default_password from the stored password hashes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Number of users to check and update per batch',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        default_password = settings.DEFAULT_USER_PASSWORD
+        checked = 0
+        changed = 0
+        batch = []
+
+        # One hash per user, once; after this the flag is maintained by set_password
+        queryset = User.objects.only('id', 'password', 'using_default_password').order_by('id')
+        for user in queryset.iterator(chunk_size=batch_size):
+            checked += 1
+            flag = user.check_password(default_password)
+            if flag != user.using_default_password:
+                user.using_default_password = flag
+                batch.append(user)
+            if len(batch) >= batch_size:
+                changed += self._save(batch)
+                batch = []
+
+        if batch:
+            changed += self._save(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {checked} users, updated {changed} flags"
+        ))
+
+    def _save(self, users):
+        User.objects.bulk_update(users, ['using_default_password'])
+        for user in users:
+            bump_auth_version(user.id)
+        return len(users)
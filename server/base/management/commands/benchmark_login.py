@@ -0,0 +1,125 @@
+import threading
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import update_last_login
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test import override_settings
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+from base.audit import writer
+from base.models import ActivityLog, User
+from base.serializers import CustomTokenObtainPairSerializer
+from base.utils import log_activity
+
+from ._benchmark import scratch_database
+
+FAST_HASHER = 'django.contrib.auth.hashers.MD5PasswordHasher'
+
+class Command(BaseCommand):
+    help = "Measure login throughput of the original and current login pipelines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=10, help='Logins per pipeline')
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Logins run in parallel, each thread with its own database connection',
+        )
+        parser.add_argument(
+            '--fast-hash',
+            action='store_true',
+            help='Use a trivial password hasher so the timings show the database work alone',
+        )
+
+    def handle(self, *args, **options):
+        logins = options['logins']
+        concurrency = max(1, options['concurrency'])
+        password = settings.DEFAULT_USER_PASSWORD
+
+        hashers = override_settings(PASSWORD_HASHERS=[FAST_HASHER]) if options['fast_hash'] else nullcontext()
+        with hashers, scratch_database(on_disk=concurrency > 1):
+            # A surge is many different users, and one shared hash keeps the
+            # setup cost flat
+            encoded = make_password(password)
+            User.objects.bulk_create([
+                User(
+                    email=f'benchmark{i}@example.com',
+                    username=f'benchmark{i}@example.com',
+                    first_name='Benchmark',
+                    last_name=str(i),
+                    password=encoded,
+                    using_default_password=True,
+                )
+                for i in range(concurrency)
+            ])
+
+            def credentials(worker):
+                return {'email': f'benchmark{worker}@example.com', 'password': password}
+
+            def original_login(worker):
+                # Validated twice (view and super().post()), each time writing
+                # last_login, then a hash for the default-password flag and a
+                # synchronous log insert: four separate commits.
+                for _ in range(2):
+                    serializer = TokenObtainPairSerializer(data=credentials(worker))
+                    serializer.is_valid(raise_exception=True)
+                    update_last_login(None, serializer.user)
+                serializer.user.check_password(password)
+                ActivityLog.objects.create(user=serializer.user, action='login')
+
+            def current_login(worker):
+                serializer = CustomTokenObtainPairSerializer(data=credentials(worker))
+                serializer.is_valid(raise_exception=True)
+                log_activity('login', user=serializer.user)
+
+            before = self._run(original_login, logins, concurrency)
+            after = self._run(current_login, logins, concurrency)
+
+        self.stdout.write(f"{logins} logins per pipeline, {concurrency} at a time")
+        for label, (rate, p95, errors) in (('before', before), ('after', after)):
+            self.stdout.write(
+                f"  {label + ':':8}{rate:8.2f} logins/s   p95 {p95 * 1000:8.1f} ms   {errors} failed"
+            )
+        if before[0]:
+            self.stdout.write(self.style.SUCCESS(f"  speedup: {after[0] / before[0]:7.2f}x"))
+
+    def _run(self, func, logins, concurrency):
+        """
+        Run ``logins`` calls of ``func`` spread over ``concurrency`` threads
+        and return (logins per second, p95 latency, failed logins).
+        """
+        latencies = []
+        errors = []
+
+        def work(worker):
+            try:
+                for _ in range(worker, logins, concurrency):
+                    start = time.perf_counter()
+                    try:
+                        func(worker)
+                    except OperationalError:
+                        # SQLite gave up waiting for the write lock
+                        errors.append(worker)
+                        continue
+                    latencies.append(time.perf_counter() - start)
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=work, args=(worker,)) for worker in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Buffered log entries are part of the cost
+        writer.flush()
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        return len(latencies) / elapsed, p95, len(errors)
@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base.models import User
+from base.serializers import UserSerializer
+
+from ._benchmark import best_of
+
+
+class Command(BaseCommand):
+    help = "Compare UserSerializer list serialization against per-row password hashing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help='Users to serialize per run')
+        parser.add_argument('--runs', type=int, default=3, help='Number of timed runs')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        runs = options['runs']
+
+        # Unsaved instances keep the benchmark off the database; one hash is
+        # shared by every row so setup cost does not scale with --rows.
+        encoded = make_password(settings.DEFAULT_USER_PASSWORD)
+        now = timezone.now()
+        users = [
+            User(
+                id=i,
+                email=f"bench{i}@example.com",
+                first_name='Bench',
+                last_name=str(i),
+                password=encoded,
+                using_default_password=True,
+                avatar=None,
+                created_at=now,
+                updated_at=now,
+            )
+            for i in range(1, rows + 1)
+        ]
+
+        def serialize_with_column():
+            return UserSerializer(users, many=True).data
+
+        def serialize_with_hash():
+            data = UserSerializer(users, many=True).data
+            for user in users:
+                user.check_password(settings.DEFAULT_USER_PASSWORD)
+            return data
+
+        column = best_of(serialize_with_column, runs)
+        hashed = best_of(serialize_with_hash, runs)
+
+        self.stdout.write(f"Serialized {rows} users, best of {runs} runs")
+        self.stdout.write(f"  stored flag:     {column * 1000:9.2f} ms")
+        self.stdout.write(f"  check_password:  {hashed * 1000:9.2f} ms")
+        if column:
+            self.stdout.write(self.style.SUCCESS(f"  speedup:         {hashed / column:9.1f}x"))
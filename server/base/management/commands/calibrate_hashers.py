@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    PBKDF2PasswordHasher,
+    ScryptPasswordHasher,
+    get_hasher,
+    identify_hasher,
+)
+from django.core.management.base import BaseCommand
+from django.utils.crypto import get_random_string
+
+from base.metrics import get_metric
+from base.models import User
+
+from ._benchmark import best_of
+
+PBKDF2_ITERATIONS = [100_000, 250_000, 500_000, 1_000_000]
+SCRYPT_WORK_FACTORS = [2**14, 2**15, 2**16]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the password hashers on this host and recommend settings for a target latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target-ms',
+            type=float,
+            default=250,
+            help='Acceptable time for one password hash on this host',
+        )
+        parser.add_argument('--runs', type=int, default=3, help='Timed runs per configuration')
+
+    def handle(self, *args, **options):
+        target = options['target_ms'] / 1000
+        runs = options['runs']
+        password = get_random_string(16)
+        salt = get_random_string(22)
+
+        self.stdout.write(f"Hash latency on this host (best of {runs}):")
+
+        pbkdf2_timings = []
+        for iterations in PBKDF2_ITERATIONS:
+            hasher = PBKDF2PasswordHasher()
+            elapsed = best_of(lambda: hasher.encode(password, salt, iterations), runs)
+            pbkdf2_timings.append((iterations, elapsed))
+            self.stdout.write(f"  pbkdf2_sha256  iterations={iterations:<10} {elapsed * 1000:8.1f} ms")
+
+        scrypt_timings = []
+        for work_factor in SCRYPT_WORK_FACTORS:
+            hasher = ScryptPasswordHasher()
+            hasher.maxmem = 256 * work_factor * hasher.block_size
+            try:
+                elapsed = best_of(lambda: hasher.encode(password, salt, work_factor), runs)
+            except (MemoryError, ValueError) as e:
+                self.stdout.write(f"  scrypt         work_factor={work_factor:<9} unavailable ({e})")
+                continue
+            scrypt_timings.append((work_factor, elapsed))
+            self.stdout.write(f"  scrypt         work_factor={work_factor:<9} {elapsed * 1000:8.1f} ms")
+
+        self.stdout.write("")
+        self.stdout.write(f"Recommended for a {target * 1000:.0f} ms target:")
+
+        # PBKDF2 cost is linear in the iteration count, so scale from the
+        # largest measurement rather than only picking from the fixed list.
+        iterations, elapsed = pbkdf2_timings[-1]
+        recommended = max(100_000, int(iterations * target / elapsed) // 10_000 * 10_000)
+        self.stdout.write("  PASSWORD_HASHER=pbkdf2_sha256")
+        self.stdout.write(f"  PASSWORD_PBKDF2_ITERATIONS={recommended}")
+
+        within_target = [work_factor for work_factor, elapsed in scrypt_timings if elapsed <= target]
+        if within_target:
+            self.stdout.write(f"  or PASSWORD_HASHER=scrypt with PASSWORD_SCRYPT_WORK_FACTOR={max(within_target)}")
+
+        self.report_current_hashes()
+
+    def report_current_hashes(self):
+        preferred = get_hasher('default')
+        pending = 0
+        total = 0
+        # must_update() only parses the stored string, so this costs no hashing
+        for encoded in User.objects.values_list('password', flat=True).iterator():
+            total += 1
+            try:
+                hasher = identify_hasher(encoded)
+            except ValueError:
+                continue
+            if hasher.algorithm != preferred.algorithm or preferred.must_update(encoded):
+                pending += 1
+
+        self.stdout.write("")
+        self.stdout.write(f"Configured hasher: {settings.PASSWORD_HASHERS[0]}")
+        self.stdout.write(f"Stored hashes awaiting upgrade on next login: {pending} of {total}")
+        self.stdout.write(f"Hashes upgraded on login so far: {get_metric('password_rehash')['count']}")
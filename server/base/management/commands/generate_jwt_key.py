@@ -0,0 +1,69 @@
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from base.jwt_keys import PRIVATE_SUFFIX, PUBLIC_SUFFIX
+
+
+class Command(BaseCommand):
+    help = (
+        "Create a JWT signing key in JWT_KEYS_DIR, or retire one so it only "
+        "verifies. Rotate by generating a key, pointing JWT_ACTIVE_KID at it, "
+        "and retiring the old key; delete the retired public key once "
+        "REFRESH_TOKEN_LIFETIME has passed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kid', help='Key id, used as the file name and the JWT kid header')
+        parser.add_argument(
+            '--algorithm',
+            choices=['RS256', 'EdDSA'],
+            default=settings.JWT_ALGORITHM if settings.JWT_ALGORITHM in ('RS256', 'EdDSA') else 'RS256',
+        )
+        parser.add_argument('--retire', action='store_true', help='Keep only the public half of KID')
+
+    def handle(self, *args, **options):
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+        keys_dir = Path(settings.JWT_KEYS_DIR)
+        kid = options['kid']
+        private_path = keys_dir / f"{kid}{PRIVATE_SUFFIX}"
+        public_path = keys_dir / f"{kid}{PUBLIC_SUFFIX}"
+
+        if options['retire']:
+            if not private_path.exists():
+                raise CommandError(f"No private key for '{kid}' in {keys_dir}")
+            if kid == settings.JWT_ACTIVE_KID:
+                raise CommandError(f"'{kid}' is the active signing key; activate another key first")
+            private_key = serialization.load_pem_private_key(private_path.read_bytes(), password=None)
+            public_path.write_bytes(private_key.public_key().public_bytes(
+                serialization.Encoding.PEM,
+                serialization.PublicFormat.SubjectPublicKeyInfo,
+            ))
+            private_path.unlink()
+            self.stdout.write(self.style.SUCCESS(f"Retired '{kid}'; it now only verifies tokens"))
+            return
+
+        if private_path.exists() or public_path.exists():
+            raise CommandError(f"Key '{kid}' already exists in {keys_dir}")
+
+        if options['algorithm'] == 'EdDSA':
+            private_key = ed25519.Ed25519PrivateKey.generate()
+        else:
+            private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+        keys_dir.mkdir(parents=True, exist_ok=True)
+        pem = private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        fd = os.open(private_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pem)
+
+        self.stdout.write(self.style.SUCCESS(f"Created {options['algorithm']} key '{kid}' at {private_path}"))
+        self.stdout.write(f"Set JWT_ALGORITHM={options['algorithm']} and JWT_ACTIVE_KID={kid} to sign with it")
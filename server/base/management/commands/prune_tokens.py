@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired outstanding and blacklisted JWTs in bounded batches. "
+        "Schedule it from cron, or pass --interval to keep it running."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tokens deleted per batch')
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between batches')
+        parser.add_argument('--max-batches', type=int, default=None, help='Stop after this many batches')
+        parser.add_argument('--interval', type=int, default=None, help='Repeat every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            self.prune(options['batch_size'], options['pause'], options['max_batches'])
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def prune(self, batch_size, pause, max_batches):
+        start = time.perf_counter()
+        now = timezone.now()
+        deleted = 0
+        batches = 0
+
+        while max_batches is None or batches < max_batches:
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lte=now)
+                .order_by('expires_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            OutstandingToken.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+            batches += 1
+            if pause:
+                time.sleep(pause)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Pruned {deleted} expired tokens in {batches} batches "
+            f"({time.perf_counter() - start:.2f}s)"
+        ))
+        self.stdout.write(
+            f"Remaining: {OutstandingToken.objects.count()} outstanding, "
+            f"{BlacklistedToken.objects.count()} blacklisted"
+        )
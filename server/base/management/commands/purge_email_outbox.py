@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base.models import EmailOutbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete sent and failed outbox emails older than "
+        "EMAIL_OUTBOX_RETENTION_DAYS. Run it periodically from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        cutoff = timezone.now() - timedelta(days=settings.EMAIL_OUTBOX_RETENTION_DAYS)
+        deleted = 0
+
+        # Pending and sending rows are still owed a delivery attempt
+        while True:
+            ids = list(
+                EmailOutbox.objects.filter(status__in=['sent', 'failed'], created_at__lte=cutoff)
+                .order_by('created_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            EmailOutbox.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} finished outbox emails"))
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base.models import PasswordResetOTP
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete password reset OTPs that expired more than "
+        "PASSWORD_RESET_OTP_RETENTION_DAYS ago. Run it periodically from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        cutoff = timezone.now() - timedelta(days=settings.PASSWORD_RESET_OTP_RETENTION_DAYS)
+        deleted = 0
+
+        # Every code expires within minutes of being issued, so the expiry
+        # cutoff covers used codes as well
+        while True:
+            ids = list(
+                PasswordResetOTP.objects.filter(expires_at__lte=cutoff)
+                .order_by('expires_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            PasswordResetOTP.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired password reset OTPs"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from base.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily activity rollups from the activity log table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='First day to rebuild (YYYY-MM-DD); defaults to the oldest entry in the database',
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+
+        rows = rebuild(since)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} activity rollup rows"))
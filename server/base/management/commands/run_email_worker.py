@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from base.outbox import deliver_pending, pool
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outbox emails, retrying failures with exponential backoff"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Messages claimed per poll')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the due messages once and exit')
+
+    def handle(self, *args, **options):
+        try:
+            self.run(options['batch_size'], options['interval'], options['once'])
+        finally:
+            pool.close()
+
+    def run(self, batch_size, interval, once):
+        while True:
+            close_old_connections()
+            sent, failed = deliver_pending(batch_size)
+            if sent or failed:
+                self.stdout.write(f"Sent {sent}, failed {failed}")
+                continue
+            if once:
+                break
+            time.sleep(interval)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from base.metrics import get_metric
+
+
+class Command(BaseCommand):
+    help = "Report token blacklist table sizes and refresh latency"
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        outstanding = OutstandingToken.objects.count()
+        expired = OutstandingToken.objects.filter(expires_at__lte=now).count()
+        blacklisted = BlacklistedToken.objects.count()
+        refresh = get_metric('token_refresh')
+
+        self.stdout.write(f"Outstanding tokens: {outstanding} ({expired} expired, prunable)")
+        self.stdout.write(f"Blacklisted tokens: {blacklisted}")
+        if refresh['count']:
+            self.stdout.write(
+                f"Token refreshes:    {refresh['count']} "
+                f"(avg {refresh['avg_ms']:.2f} ms)"
+            )
+        else:
+            self.stdout.write("Token refreshes:    none recorded")
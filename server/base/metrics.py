@@ -0,0 +1,45 @@
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+METRIC_KEY = 'metrics:{name}:{field}'
+
+def _incr(key, delta):
+    # add() seeds the counter so incr() is atomic on shared backends
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, timeout=None)
+
+def record_count(name, delta=1):
+    _incr(METRIC_KEY.format(name=name, field='count'), delta)
+
+def record_timing(name, seconds):
+    """
+    Accumulate a call count and total duration for ``name`` in the shared
+    cache so that every worker contributes to the same figures.
+    """
+    record_count(name)
+    _incr(METRIC_KEY.format(name=name, field='total_us'), int(seconds * 1_000_000))
+
+@contextmanager
+def timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - start)
+
+def get_metric(name):
+    count_key = METRIC_KEY.format(name=name, field='count')
+    total_key = METRIC_KEY.format(name=name, field='total_us')
+    values = cache.get_many([count_key, total_key])
+    count = values.get(count_key, 0)
+    total_us = values.get(total_key, 0)
+    return {
+        'count': count,
+        'total_ms': total_us / 1000,
+        'avg_ms': (total_us / 1000 / count) if count else None,
+    }
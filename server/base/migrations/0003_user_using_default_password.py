@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0002_alter_activitylog_action_alter_todo_owner_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='using_default_password',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+INDEX = models.Index(fields=['expires_at'], name='outstandingtoken_expires_idx')
+
+
+def add_index(apps, schema_editor):
+    OutstandingToken = apps.get_model('token_blacklist', 'OutstandingToken')
+    schema_editor.add_index(OutstandingToken, INDEX)
+
+
+def remove_index(apps, schema_editor):
+    OutstandingToken = apps.get_model('token_blacklist', 'OutstandingToken')
+    schema_editor.remove_index(OutstandingToken, INDEX)
+
+
+class Migration(migrations.Migration):
+    # token_blacklist is a third-party app, so the index that prune_tokens
+    # relies on is added to its table from here.
+
+    dependencies = [
+        ('base', '0003_user_using_default_password'),
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
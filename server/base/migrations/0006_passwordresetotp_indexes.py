@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0005_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='passwordresetotp',
+            index=models.Index(condition=models.Q(('is_used', False)), fields=['user', 'otp', 'expires_at'], name='otp_active_lookup_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passwordresetotp',
+            index=models.Index(fields=['expires_at'], name='otp_expires_idx'),
+        ),
+    ]
@@ -0,0 +1,125 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:37
+
+from django.db import migrations, models
+
+# Copied from base.fts as it was when this migration was written, so later
+# changes there do not alter what it does
+FTS_TABLE = 'base_activitylog_fts'
+SEARCH_CONFIG = 'simple'
+
+BATCH_SIZE = 1000
+
+
+def flatten(value):
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from flatten(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from flatten(item)
+    elif value is not None and not isinstance(value, bool):
+        yield str(value)
+
+
+def build_search_document(admin, user, details):
+    parts = []
+    for person in (admin, user):
+        if person is not None:
+            parts += [person.first_name, person.last_name, person.email]
+    parts += flatten(details or {})
+    return ' '.join(part for part in parts if part)
+
+SQLITE_CREATE = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        search_document,
+        content='base_activitylog',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON base_activitylog BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON base_activitylog BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document)
+        VALUES ('delete', old.id, old.search_document);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF search_document ON base_activitylog BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document)
+        VALUES ('delete', old.id, old.search_document);
+        INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+POSTGRES_INDEX = 'activitylog_search_gin_idx'
+
+
+def backfill_search_document(apps, schema_editor):
+    ActivityLog = apps.get_model('base', 'ActivityLog')
+    manager = ActivityLog.objects.using(schema_editor.connection.alias)
+    queryset = manager.select_related('admin', 'user')
+    batch = []
+    for log in queryset.order_by('id').iterator(chunk_size=BATCH_SIZE):
+        log.search_document = build_search_document(log.admin, log.user, log.details)
+        batch.append(log)
+        if len(batch) >= BATCH_SIZE:
+            manager.bulk_update(batch, ['search_document'])
+            batch = []
+    if batch:
+        manager.bulk_update(batch, ['search_document'])
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            if not cursor.fetchone()[0]:
+                # Searches fall back to icontains on search_document
+                return
+        for statement in SQLITE_CREATE:
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        from django.contrib.postgres.indexes import GinIndex
+        from django.contrib.postgres.search import SearchVector
+
+        ActivityLog = apps.get_model('base', 'ActivityLog')
+        schema_editor.add_index(ActivityLog, GinIndex(
+            SearchVector('search_document', config=SEARCH_CONFIG),
+            name=POSTGRES_INDEX,
+        ))
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in SQLITE_DROP:
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {POSTGRES_INDEX}')
+
+
+class Migration(migrations.Migration):
+    # The search index depends on the database backend, so it is created
+    # here rather than declared in ActivityLog.Meta.indexes.
+
+    dependencies = [
+        ('base', '0008_activitylog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activitylog',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_search_document, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
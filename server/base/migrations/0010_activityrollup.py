@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0009_activitylog_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('action', models.CharField(choices=[('user_created', 'User Created'), ('password_reset', 'Password Reset'), ('status_changed', 'Status Changed'), ('user_updated', 'User Updated'), ('user_deleted', 'User Deleted'), ('profile_updated', 'Profile Updated'), ('avatar_updated', 'Avatar Updated'), ('login', 'User Login'), ('logout', 'User Logout'), ('otp_sent', 'OTP Sent'), ('password_reset_success', 'Password Reset Successful')], max_length=50)),
+                ('actor_id', models.BigIntegerField(default=0)),
+                ('target_id', models.BigIntegerField(default=0)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Activity Rollup',
+                'verbose_name_plural': 'Activity Rollups',
+                'constraints': [models.UniqueConstraint(fields=('day', 'action', 'actor_id', 'target_id'), name='activity_rollup_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0010_activityrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activitylog',
+            name='ip_address',
+            field=models.GenericIPAddressField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='activitylog',
+            name='reset_by_admin',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='activitylog',
+            name='target_email',
+            field=models.CharField(blank=True, default='', editable=False, max_length=254),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['ip_address', '-created_at', '-id'], name='activitylog_ip_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['target_email', '-created_at', '-id'], name='activitylog_target_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(condition=models.Q(('reset_by_admin', True)), fields=['-created_at', '-id'], name='activitylog_admin_reset_idx'),
+        ),
+    ]
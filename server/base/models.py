@@ -1,10 +1,16 @@
+import ipaddress
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
+from django.utils.crypto import constant_time_compare
 from datetime import timedelta
 from django.utils import timezone
 
+from .fts import build_search_document
+from .metrics import record_count
+
 def default_avatar():
     return 'avatars/default.jpg'
 
@@ -78,6 +84,7 @@ class User(AbstractUser):
         blank=True,
         default=default_avatar
     )
+    using_default_password = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -103,9 +110,34 @@ class User(AbstractUser):
         related_query_name="user",
     )
 
-    @property
-    def using_default_password(self):
-        return self.check_password(settings.DEFAULT_USER_PASSWORD)
+    def set_password(self, raw_password):
+        # Keep the default-password flag in step with the stored hash so
+        # callers never have to run the hasher just to read it back.
+        self.using_default_password = raw_password is not None and constant_time_compare(
+            raw_password, settings.DEFAULT_USER_PASSWORD
+        )
+        super().set_password(raw_password)
+
+    def check_password(self, raw_password):
+        encoded = self.password
+        valid = super().check_password(raw_password)
+        if valid and self.password != encoded:
+            # Django re-encoded the hash for the current PASSWORD_HASHERS
+            record_count('password_rehash')
+        return valid
+
+    def touch_last_login(self):
+        """
+        Record a login, writing last_login at most once per
+        LAST_LOGIN_UPDATE_MINUTES. Returns whether it was written.
+        """
+        now = timezone.now()
+        interval = timedelta(minutes=settings.LAST_LOGIN_UPDATE_MINUTES)
+        if self.last_login and now - self.last_login < interval:
+            return False
+        User.objects.filter(pk=self.pk).update(last_login=now)
+        self.last_login = now
+        return True
 
     def save(self, *args, **kwargs):
         if not self.username:
@@ -134,12 +166,64 @@ class ActivityLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='user_activities')
     action = models.CharField(max_length=50, choices=ACTION_CHOICES)
     details = models.JSONField(default=dict)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the entry is built, not when a buffered batch is inserted
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Names, emails and details as of the action, indexed for search (base/fts.py)
+    search_document = models.TextField(blank=True, default='', editable=False)
+    # Copied out of details so the common filters are index lookups
+    ip_address = models.GenericIPAddressField(null=True, blank=True, editable=False)
+    target_email = models.CharField(max_length=254, blank=True, default='', editable=False)
+    reset_by_admin = models.BooleanField(default=False, editable=False)
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Activity Log'
         verbose_name_plural = 'Activity Logs'
+        # Each listing filter plus the (created_at, id) keyset order, so any
+        # page is an index range scan
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='activitylog_created_idx'),
+            models.Index(fields=['action', '-created_at', '-id'], name='activitylog_action_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='activitylog_user_idx'),
+            models.Index(fields=['admin', '-created_at', '-id'], name='activitylog_admin_idx'),
+            models.Index(fields=['ip_address', '-created_at', '-id'], name='activitylog_ip_idx'),
+            models.Index(fields=['target_email', '-created_at', '-id'], name='activitylog_target_email_idx'),
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(reset_by_admin=True),
+                name='activitylog_admin_reset_idx',
+            ),
+        ]
+
+    @staticmethod
+    def detail_columns(details):
+        """
+        Values of the indexed columns taken from ``details``.
+        """
+        details = details if isinstance(details, dict) else {}
+        try:
+            ip_address = str(ipaddress.ip_address(str(details.get('ip_address')).strip()))
+        except ValueError:
+            ip_address = None
+        target_email = details.get('target_email') or details.get('email') or ''
+        return {
+            'ip_address': ip_address,
+            'target_email': str(target_email).strip().lower()[:254],
+            'reset_by_admin': details.get('reset_by_admin') is True,
+        }
+
+    def populate_derived_fields(self):
+        """
+        Fill the columns computed from the entry itself. Called on save and
+        by the audit writer before a bulk insert, which skips save().
+        """
+        self.search_document = build_search_document(self.admin, self.user, self.details)
+        for field, value in self.detail_columns(self.details).items():
+            setattr(self, field, value)
+
+    def save(self, *args, **kwargs):
+        self.populate_derived_fields()
+        super().save(*args, **kwargs)
 
     def __str__(self):
         if self.admin and self.user:
@@ -149,6 +233,35 @@ class ActivityLog(models.Model):
         else:
             return f"System: {self.get_action_display()} at {self.created_at}"
 
+class ActivityRollup(models.Model):
+    """
+    Activity log entries counted per day, action, actor and target, kept up
+    to date as entries are written (base/rollups.py). Ids are plain integers
+    rather than foreign keys so the history outlives deleted users and
+    archived log rows; 0 means none.
+    """
+    day = models.DateField()
+    action = models.CharField(max_length=50, choices=ActivityLog.ACTION_CHOICES)
+    # Who acted: the admin for admin actions, otherwise the user
+    actor_id = models.BigIntegerField(default=0)
+    # Whom an admin action was about
+    target_id = models.BigIntegerField(default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Activity Rollup'
+        verbose_name_plural = 'Activity Rollups'
+        constraints = [
+            # Its index also serves the chart query, a range read on day
+            models.UniqueConstraint(
+                fields=['day', 'action', 'actor_id', 'target_id'],
+                name='activity_rollup_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.action}: {self.count}"
+
 class PasswordResetOTP(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='password_reset_otps')
     otp = models.CharField(max_length=6)
@@ -160,6 +273,15 @@ class PasswordResetOTP(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Password Reset OTP'
         verbose_name_plural = 'Password Reset OTPs'
+        indexes = [
+            # Only unused codes are ever looked up or invalidated
+            models.Index(
+                fields=['user', 'otp', 'expires_at'],
+                condition=models.Q(is_used=False),
+                name='otp_active_lookup_idx',
+            ),
+            models.Index(fields=['expires_at'], name='otp_expires_idx'),
+        ]
 
     def __str__(self):
         return f"OTP for {self.user.email} (expires: {self.expires_at})"
@@ -169,9 +291,48 @@ class PasswordResetOTP(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.expires_at:
-            self.expires_at = timezone.now() + timedelta(minutes=15)
+            self.expires_at = timezone.now() + timedelta(minutes=settings.PASSWORD_RESET_OTP_EXPIRE_MINUTES)
         super().save(*args, **kwargs)
 
+class EmailOutbox(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='outbox_emails')
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField(default=list)
+    reply_to = models.JSONField(default=list, blank=True)
+    # ActivityLog entries written by the worker once the outcome is known
+    success_action = models.CharField(max_length=50, blank=True)
+    failure_action = models.CharField(max_length=50, blank=True)
+    log_details = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = 'Outbox Email'
+        verbose_name_plural = 'Outbox Emails'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} ({self.status})"
+
 class Todo(models.Model):
     name = models.CharField(max_length=200)
     completed = models.BooleanField(default=False)
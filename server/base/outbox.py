@@ -0,0 +1,263 @@
+import logging
+import smtplib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .metrics import record_count, record_timing
+from .models import EmailOutbox
+from .utils import log_activity
+
+logger = logging.getLogger(__name__)
+
+def queue_email(subject, body, to, html_body='', from_email=None, reply_to=None, user=None,
+                success_action='', failure_action='', log_details=None):
+    """
+    Store an email for the delivery worker and return immediately.
+
+    ``success_action``/``failure_action`` name the ActivityLog entries the
+    worker writes for ``user`` once the outcome is known; ``log_details`` is
+    used as their details.
+    """
+    return EmailOutbox.objects.create(
+        **outbox_fields(subject, body, to, html_body, from_email, reply_to, user,
+                        success_action, failure_action, log_details)
+    )
+
+def queue_emails(messages):
+    """
+    Bulk variant of queue_email: ``messages`` is an iterable of keyword
+    dicts for queue_email, stored with a single INSERT.
+    """
+    return EmailOutbox.objects.bulk_create(
+        [EmailOutbox(**outbox_fields(**message)) for message in messages]
+    )
+
+def outbox_fields(subject, body, to, html_body='', from_email=None, reply_to=None, user=None,
+                  success_action='', failure_action='', log_details=None):
+    return dict(
+        user=user,
+        subject=subject,
+        body=body,
+        html_body=html_body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL or '',
+        to=list(to),
+        reply_to=list(reply_to or []),
+        success_action=success_action,
+        failure_action=failure_action,
+        log_details=log_details or {},
+        max_attempts=settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+    )
+
+def account_created_email(user, admin):
+    html_message = render_to_string('email/account_created.html', {
+        'user': user,
+        'admin': admin,
+        'default_password': settings.DEFAULT_USER_PASSWORD,
+        'login_url': settings.FRONTEND_LOGIN_URL
+    })
+    return {
+        'subject': 'Your IERMS Account Has Been Created',
+        'body': strip_tags(html_message),
+        'html_body': html_message,
+        'from_email': settings.EMAIL_HOST_USER,
+        'to': [user.email],
+        'user': user,
+    }
+
+def admin_password_reset_email(user, admin):
+    html_message = render_to_string('email/password_reset_by_admin.html', {
+        'user': user,
+        'admin': admin,
+        'default_password': settings.DEFAULT_USER_PASSWORD,
+        'login_url': settings.FRONTEND_LOGIN_URL,
+        'system_name': settings.SYSTEM_NAME,
+        'support_email': settings.SUPPORT_EMAIL,
+        'reset_time': timezone.now().strftime('%Y-%m-%d %H:%M:%S')
+    })
+    return {
+        'subject': f"{settings.SYSTEM_NAME} Password Reset Notification",
+        'body': strip_tags(html_message),
+        'html_body': html_message,
+        'to': [user.email],
+        'reply_to': [settings.SUPPORT_EMAIL],
+        'user': user,
+        'success_action': 'password_reset_email_sent',
+        'failure_action': 'password_reset_email_failed',
+        'log_details': {'email': user.email},
+    }
+
+def queue_account_created_emails(users, admin):
+    return queue_emails(account_created_email(user, admin) for user in users)
+
+def queue_admin_password_reset_emails(users, admin):
+    return queue_emails(admin_password_reset_email(user, admin) for user in users)
+
+def build_message(entry):
+    message = EmailMultiAlternatives(
+        subject=entry.subject,
+        body=entry.body,
+        from_email=entry.from_email or None,
+        to=entry.to,
+        reply_to=entry.reply_to or None,
+    )
+    if entry.html_body:
+        message.attach_alternative(entry.html_body, "text/html")
+    return message
+
+def claim_due(limit):
+    """
+    Lease up to ``limit`` due messages to this worker. The claim is a
+    conditional UPDATE per row, so concurrent workers never send the same
+    message twice, and a crashed worker's lease simply runs out.
+    """
+    now = timezone.now()
+    lease = now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS)
+    due = (
+        Q(status='pending', next_attempt_at__lte=now) |
+        Q(status='sending', locked_until__lte=now)
+    )
+    claimed = []
+    for entry in EmailOutbox.objects.filter(due).order_by('next_attempt_at')[:limit]:
+        updated = EmailOutbox.objects.filter(pk=entry.pk, status=entry.status, locked_until=entry.locked_until).update(
+            status='sending',
+            locked_until=lease,
+        )
+        if updated:
+            entry.status = 'sending'
+            entry.locked_until = lease
+            claimed.append(entry)
+    return claimed
+
+def retry_delay(attempts):
+    delay = settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(delay, settings.EMAIL_OUTBOX_RETRY_MAX_SECONDS))
+
+def mark_sent(entry):
+    entry.status = 'sent'
+    entry.attempts += 1
+    entry.sent_at = timezone.now()
+    entry.locked_until = None
+    entry.last_error = ''
+    # Bodies can hold OTP codes and default passwords; once delivered they
+    # are not needed again
+    entry.body = ''
+    entry.html_body = ''
+    entry.save(update_fields=['status', 'attempts', 'sent_at', 'locked_until', 'last_error', 'body', 'html_body'])
+    if entry.success_action:
+        log_activity(entry.success_action, user=entry.user, details=entry.log_details)
+
+def mark_failed(entry, error):
+    entry.attempts += 1
+    entry.last_error = str(error)
+    entry.locked_until = None
+    if entry.attempts >= entry.max_attempts:
+        entry.status = 'failed'
+    else:
+        entry.status = 'pending'
+        entry.next_attempt_at = timezone.now() + retry_delay(entry.attempts)
+    entry.save(update_fields=['status', 'attempts', 'last_error', 'locked_until', 'next_attempt_at'])
+
+    if entry.status == 'failed':
+        logger.error(f"Giving up on outbox email {entry.pk} to {entry.to}: {error}")
+        if entry.failure_action:
+            log_activity(
+                entry.failure_action,
+                user=entry.user,
+                details={**entry.log_details, 'error': entry.last_error, 'attempts': entry.attempts}
+            )
+    else:
+        logger.warning(f"Outbox email {entry.pk} failed (attempt {entry.attempts}), retrying: {error}")
+
+class PooledConnection:
+    """
+    Keeps one email backend connection open across batches so that a burst
+    of messages pays for a single connect and TLS handshake. The connection
+    is recycled after EMAIL_CONNECTION_MAX_IDLE_SECONDS without use or
+    EMAIL_CONNECTION_MAX_MESSAGES messages, and reopened after a connection
+    error.
+    """
+
+    def __init__(self):
+        self.connection = None
+        self.last_used = 0
+        self.messages = 0
+
+    def get(self):
+        stale = (
+            time.monotonic() - self.last_used > settings.EMAIL_CONNECTION_MAX_IDLE_SECONDS or
+            self.messages >= settings.EMAIL_CONNECTION_MAX_MESSAGES
+        )
+        if self.connection is not None and stale:
+            self.close()
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=False)
+            self.connection.open()
+            self.messages = 0
+        self.last_used = time.monotonic()
+        return self.connection
+
+    def sent(self):
+        self.messages += 1
+        self.last_used = time.monotonic()
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+pool = PooledConnection()
+
+def connection_lost(error):
+    """
+    Whether ``error`` broke the SMTP session itself. SMTPException is an
+    OSError too, but a refused recipient or rejected message leaves the
+    session usable for the next one.
+    """
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+def deliver_pending(limit=50):
+    """
+    Send up to ``limit`` due messages over the pooled connection and return
+    (sent, failed) counts. Each message is sent on its own so that one bad
+    recipient only fails that message.
+    """
+    entries = claim_due(limit)
+    sent = failed = 0
+    if not entries:
+        return sent, failed
+
+    start = time.perf_counter()
+    for entry in entries:
+        message_start = time.perf_counter()
+        try:
+            connection = pool.get()
+            connection.send_messages([build_message(entry)])
+        except Exception as e:
+            if connection_lost(e):
+                # The session is unusable; the next message gets a fresh one
+                pool.close()
+            mark_failed(entry, e)
+            failed += 1
+        else:
+            pool.sent()
+            mark_sent(entry)
+            sent += 1
+        record_timing('email_send', time.perf_counter() - message_start)
+
+    elapsed = time.perf_counter() - start
+    record_count('email_sent', sent)
+    record_count('email_failed', failed)
+    logger.info(f"Delivered {sent} emails ({failed} failed) in {elapsed:.2f}s, {len(entries) / elapsed:.1f} msg/s")
+    return sent, failed
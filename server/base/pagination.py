@@ -0,0 +1,130 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of OFFSET, each page continues from the sort key of the last row
+it returned, so page 10,000 costs the same as page 1 when an index covers
+the ordering. Cursors are opaque url-safe tokens holding that sort key and
+the direction to read in.
+"""
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+MAX_PAGE_SIZE = 100
+
+class InvalidCursor(ValueError):
+    pass
+
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # Keep microseconds; DjangoJSONEncoder rounds datetimes to
+        # milliseconds, which would skip or repeat rows at a page boundary.
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+def encode_cursor(values, reverse=False):
+    payload = {'v': values, 'r': reverse}
+    data = json.dumps(payload, cls=CursorEncoder, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+def decode_cursor(token, length):
+    try:
+        data = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(data)
+        values, reverse = payload['v'], payload['r']
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(values, list) or len(values) != length or not isinstance(reverse, bool):
+        raise InvalidCursor('Invalid cursor')
+    return values, reverse
+
+def parse_page_size(value, default=20):
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+class CountedPaginator(Paginator):
+    """
+    A Paginator whose total is supplied by the caller (cached or estimated)
+    instead of a COUNT(*) on every page.
+    """
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count = count
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` by ``ordering``, a tuple of field names with an
+    optional '-' prefix, e.g. ('-created_at', '-id'). The last field must be
+    unique so that every row has a distinct position.
+    """
+
+    def __init__(self, queryset, ordering, page_size):
+        self.queryset = queryset
+        self.ordering = ordering
+        self.fields = [field.lstrip('-') for field in ordering]
+        self.descending = [field.startswith('-') for field in ordering]
+        self.page_size = page_size
+
+    def page(self, cursor=None):
+        """
+        Return (rows, next_cursor, previous_cursor) for the page after
+        ``cursor``, or the first page when it is empty.
+        """
+        values, reverse = decode_cursor(cursor, len(self.fields)) if cursor else (None, False)
+
+        queryset = self.queryset
+        ordering = self.reversed_ordering() if reverse else self.ordering
+        try:
+            if values is not None:
+                queryset = queryset.filter(self.after(values, reverse))
+            rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        except (ValidationError, ValueError, TypeError):
+            # A well-formed token whose values do not fit the fields
+            raise InvalidCursor('Invalid cursor')
+
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        if not rows:
+            return rows, None, None
+        # Reading backwards, the rows after this page are where we came from
+        has_next = has_more if not reverse else True
+        has_previous = has_more if reverse else values is not None
+        next_cursor = encode_cursor(self.position(rows[-1])) if has_next else None
+        previous_cursor = encode_cursor(self.position(rows[0]), reverse=True) if has_previous else None
+        return rows, next_cursor, previous_cursor
+
+    def position(self, row):
+        return [getattr(row, field) for field in self.fields]
+
+    def reversed_ordering(self):
+        return [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering]
+
+    def after(self, values, reverse):
+        """
+        Rows strictly after ``values`` in the reading direction:
+        (a > x) OR (a = x AND b > y) OR ..., plus a plain range on the first
+        field so the database can seek the index rather than scan it.
+        """
+        def lookup(index, inclusive=False):
+            forward = self.descending[index] == reverse
+            op = 'gt' if forward else 'lt'
+            return f'{self.fields[index]}__{op}{"e" if inclusive else ""}'
+
+        condition = Q()
+        for i in range(len(self.fields)):
+            equal = {self.fields[j]: values[j] for j in range(i)}
+            condition |= Q(**equal, **{lookup(i): values[i]})
+        return Q(**{lookup(0, inclusive=True): values[0]}) & condition
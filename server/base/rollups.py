@@ -0,0 +1,81 @@
+"""
+Daily activity counts for the dashboards.
+
+ActivityRollup rows are incremented from the entries of every audit writer
+flush, so a chart over any period reads one row per day, action, actor and
+target instead of scanning ActivityLog. rebuild() recomputes them from the
+log table, e.g. after a bulk import or a change to how entries are counted.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min
+from django.db.models.functions import TruncDate
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .audit import activity_logs_written
+from .models import ActivityLog, ActivityRollup
+
+def rollup_key(day, action, admin_id, user_id):
+    if admin_id:
+        return day, action, admin_id, user_id or 0
+    return day, action, user_id or 0, 0
+
+def add(totals):
+    """
+    Add ``totals`` ({(day, action, actor_id, target_id): count}) to the
+    stored rollups.
+    """
+    with transaction.atomic():
+        for (day, action, actor_id, target_id), count in totals.items():
+            key = dict(day=day, action=action, actor_id=actor_id, target_id=target_id)
+            if ActivityRollup.objects.filter(**key).update(count=F('count') + count):
+                continue
+            try:
+                with transaction.atomic():
+                    ActivityRollup.objects.create(**key, count=count)
+            except IntegrityError:
+                # Another writer created the row first
+                ActivityRollup.objects.filter(**key).update(count=F('count') + count)
+
+@receiver(activity_logs_written)
+def activity_logs_written_handler(sender, entries, **kwargs):
+    add(Counter(
+        rollup_key(timezone.localdate(entry.created_at), entry.action, entry.admin_id, entry.user_id)
+        for entry in entries
+    ))
+
+def rebuild(since=None):
+    """
+    Recompute the rollups from ``since`` (a date; by default the oldest
+    entry still in the database) onwards and return the number of rows.
+    Days before it, including archived months, are left as they are.
+    """
+    logs = ActivityLog.objects.order_by()
+    if since is None:
+        oldest = logs.aggregate(oldest=Min('created_at'))['oldest']
+        if oldest is None:
+            return 0
+        since = timezone.localdate(oldest)
+
+    rows = (
+        logs.filter(created_at__date__gte=since)
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'action', 'admin_id', 'user_id')
+        .annotate(entries=Count('id'))
+    )
+    totals = Counter()
+    for row in rows.iterator():
+        totals[rollup_key(row['day'], row['action'], row['admin_id'], row['user_id'])] += row['entries']
+
+    with transaction.atomic():
+        ActivityRollup.objects.filter(day__gte=since).delete()
+        ActivityRollup.objects.bulk_create(
+            [
+                ActivityRollup(day=day, action=action, actor_id=actor_id, target_id=target_id, count=count)
+                for (day, action, actor_id, target_id), count in totals.items()
+            ],
+            batch_size=1000,
+        )
+    return len(totals)
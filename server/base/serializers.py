@@ -1,11 +1,61 @@
 from rest_framework import serializers
+from rest_framework.exceptions import PermissionDenied
+from .authentication import bump_auth_version
 from .models import User, Todo, ActivityLog, PasswordResetOTP
+from .tokens import CachedRefreshToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.conf import settings
+from django.db import transaction
+from django.contrib.auth.models import update_last_login
 from datetime import timedelta
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from django.core.exceptions import ValidationError
 
+class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = CachedRefreshToken
+
+    def validate(self, attrs):
+        # TokenObtainSerializer.validate runs authenticate(), which is the only
+        # password hash of the whole login; everything below reuses its result.
+        data = super(TokenObtainPairSerializer, self).validate(attrs)
+        user = self.user
+
+        if user.status != 'active':
+            raise PermissionDenied('Your account is not active.')
+
+        # The submitted password has just been verified, so comparing it with
+        # the default is exact and costs no extra hash.
+        using_default_password = constant_time_compare(
+            attrs['password'], settings.DEFAULT_USER_PASSWORD
+        )
+        # The login's writes share one transaction, so under a burst of
+        # logins each takes the database write lock once instead of up to
+        # three times. The login ActivityLog entry goes through the
+        # buffered audit writer.
+        with transaction.atomic():
+            if user.using_default_password != using_default_password:
+                user.using_default_password = using_default_password
+                User.objects.filter(pk=user.pk).update(using_default_password=using_default_password)
+                bump_auth_version(user.pk)
+
+            refresh = self.get_token(user)
+            data['refresh'] = str(refresh)
+            data['access'] = str(refresh.access_token)
+            data['using_default_password'] = using_default_password
+
+            if api_settings.UPDATE_LAST_LOGIN:
+                update_last_login(None, user)
+            else:
+                user.touch_last_login()
+
+        return data
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = CachedRefreshToken
+
 class UserRegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(
         write_only=True,
@@ -73,7 +123,7 @@ class UserRegisterSerializer(serializers.ModelSerializer):
 
 class UserSerializer(serializers.ModelSerializer):
     avatar_url = serializers.SerializerMethodField()
-    using_default_password = serializers.SerializerMethodField()
+    using_default_password = serializers.BooleanField(read_only=True)
     
     class Meta:
         model = User
@@ -104,9 +154,6 @@ class UserSerializer(serializers.ModelSerializer):
                 return f"{url}?t={int(obj.updated_at.timestamp())}"
             return obj.avatar.url
         return None
-    
-    def get_using_default_password(self, obj):
-        return obj.using_default_password
 
 class PasswordResetRequestSerializer(serializers.Serializer):
     email = serializers.EmailField(required=True)
@@ -1,3 +1,889 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import shutil
+import smtplib
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, get_hasher
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import TokenBackendError, TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from . import archive, audit, live, outbox, rollups
+from .jwt_keys import KeyRingTokenBackend, load_key_ring
+from .management.commands.calibrate_hashers import Command as CalibrateHashersCommand
+from .metrics import get_metric
+from .authentication import bump_auth_version, get_cached_user
+from .checks import check_throttle_cache
+from .models import ActivityLog, ActivityRollup, EmailOutbox, User
+from .pagination import encode_cursor
+from .throttling import PasswordResetRateThrottle
+from .tokens import LIVE_TOKEN_KEY, CachedRefreshToken
+from .utils import log_activity
+
+class SharedCacheMixin:
+    """
+    Use a cache shared between processes, as in production, instead of the
+    process-local default.
+    """
+
+    def setUp(self):
+        super().setUp()
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        caches = override_settings(CACHES={
+            **settings.CACHES,
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+        })
+        caches.enable()
+        self.addCleanup(caches.disable)
+
+class ActivityLogCursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='admin@example.com',
+            username='admin@example.com',
+            password='password',
+            first_name='Admin',
+            last_name='User',
+            user_level='administrator',
+        )
+        for _ in range(3):
+            log_activity('login', user=cls.admin)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_first_page(self):
+        response = self.client.get('/api/activity-logs/', {'cursor': '', 'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertIsNotNone(response.json()['next'])
+
+    def test_forged_cursor(self):
+        # Well-formed tokens whose values do not fit (created_at, id)
+        for values in (['x', 'abc'], ['x', [1]], [{}, 1]):
+            response = self.client.get('/api/activity-logs/', {'cursor': encode_cursor(values)})
+            self.assertEqual(response.status_code, 400, values)
+            self.assertFalse(response.json()['success'])
+
+    def test_garbled_cursor(self):
+        response = self.client.get('/api/activity-logs/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+@override_settings(ACTIVITY_LOG_BUFFERED=True, ACTIVITY_LOG_BATCH_SIZE=3, ACTIVITY_LOG_FLUSH_SECONDS=0.01)
+class AuditWriterTests(TestCase):
+    """
+    The buffer is flushed on the test thread: the writer thread is not
+    started and flush_when_due() is called directly.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='writer@example.com',
+            username='writer@example.com',
+            password='password',
+            first_name='Buffered',
+            last_name='Writer',
+        )
+
+    def setUp(self):
+        self.writer = audit.AuditWriter()
+        for patcher in (
+            mock.patch.object(audit.AuditWriter, 'ensure_thread'),
+            # It would close the test database connection
+            mock.patch.object(audit, 'close_old_connections'),
+            mock.patch.object(audit, 'writer', self.writer),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.batches = []
+        receiver = lambda entries, **kwargs: self.batches.append(len(entries))
+        audit.activity_logs_written.connect(receiver, weak=False)
+        self.addCleanup(audit.activity_logs_written.disconnect, receiver)
+
+    def write(self, count):
+        for _ in range(count):
+            self.writer.write(ActivityLog(user=self.user, action='login'))
+
+    def test_buffered_until_flushed(self):
+        self.write(2)
+        self.assertEqual(ActivityLog.objects.count(), 0)
+        self.assertFalse(self.writer.wakeup.is_set())
+
+    def test_flush_on_batch_size(self):
+        self.write(3)
+        self.assertTrue(self.writer.wakeup.is_set())
+        self.writer.flush_when_due()
+        self.assertEqual(ActivityLog.objects.count(), 3)
+        self.assertEqual(self.batches, [3])
+
+    def test_flush_on_interval(self):
+        self.write(1)
+        self.writer.flush_when_due()
+        self.assertEqual(ActivityLog.objects.count(), 1)
+        self.assertEqual(self.batches, [1])
+
+    def test_flush_on_exit(self):
+        self.write(2)
+        audit.flush_on_exit()
+        self.assertEqual(ActivityLog.objects.count(), 2)
+        self.assertEqual(self.batches, [2])
+
+    def test_durable_written_at_once(self):
+        self.writer.write(ActivityLog(user=self.user, action='logout'), durable=True)
+        self.assertEqual(ActivityLog.objects.count(), 1)
+        self.assertEqual(self.writer.pending, [])
+
+class CachedUserTests(SharedCacheMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='cached@example.com',
+            username='cached@example.com',
+            password='password',
+            first_name='Cached',
+            last_name='User',
+        )
+
+    def authenticate(self):
+        client = APIClient()
+        access = CachedRefreshToken.for_user(self.user).access_token
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return client
+
+    def test_cached_until_bumped(self):
+        get_cached_user(self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(status='inactive')
+        self.assertEqual(get_cached_user(self.user.pk).status, 'active')
+        bump_auth_version(self.user.pk)
+        self.assertEqual(get_cached_user(self.user.pk).status, 'inactive')
+
+    def test_password_not_cached(self):
+        user = get_cached_user(self.user.pk)
+        self.assertIn('password', user.get_deferred_fields())
+
+    def test_local_cache_reads_database(self):
+        # A bump on another worker would not reach this process's cache
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            get_cached_user(self.user.pk)
+            User.objects.filter(pk=self.user.pk).update(status='inactive')
+            self.assertEqual(get_cached_user(self.user.pk).status, 'inactive')
+
+    def test_profile_update_keeps_newer_columns(self):
+        client = self.authenticate()
+        client.get('/api/me/')
+        # Changed after the identity was cached, without a bump
+        User.objects.filter(pk=self.user.pk).update(first_name='Renamed')
+        response = client.patch('/api/me/update/', {'last_name': 'Updated'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.first_name, self.user.last_name), ('Renamed', 'Updated'))
+
+class TokenTestMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='token@example.com',
+            username='token@example.com',
+            password='password',
+            first_name='Token',
+            last_name='User',
+        )
+
+    def assertRejected(self, token):
+        with self.assertRaises(TokenError):
+            CachedRefreshToken(str(token))
+
+    def test_rotated_token_replayed(self):
+        client = APIClient()
+        refresh = CachedRefreshToken.for_user(self.user)
+        client.cookies['refresh_token'] = str(refresh)
+        self.assertEqual(client.post('/api/token/refresh/').status_code, 200)
+        client.cookies['refresh_token'] = str(refresh)
+        self.assertEqual(client.post('/api/token/refresh/').status_code, 400)
+
+class PasswordRehashTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='rehash@example.com',
+            username='rehash@example.com',
+            password='password',
+            first_name='Rehash',
+            last_name='User',
+        )
+        # A hash from before the iteration count was raised
+        cls.user.password = PBKDF2PasswordHasher().encode('password', 'saltsaltsalt', iterations=1000)
+        cls.user.save(update_fields=['password'])
+
+    def setUp(self):
+        cache.clear()
+
+    def pending_upgrades(self):
+        out = StringIO()
+        CalibrateHashersCommand(stdout=out).report_current_hashes()
+        return out.getvalue()
+
+    def test_rehashed_on_login(self):
+        self.assertIn('awaiting upgrade on next login: 1 of 1', self.pending_upgrades())
+
+        user = User.objects.get(pk=self.user.pk)
+        self.assertTrue(user.check_password('password'))
+        user.refresh_from_db()
+        self.assertFalse(get_hasher('default').must_update(user.password))
+        self.assertEqual(get_metric('password_rehash')['count'], 1)
+        self.assertIn('awaiting upgrade on next login: 0 of 1', self.pending_upgrades())
+
+    def test_wrong_password_not_rehashed(self):
+        user = User.objects.get(pk=self.user.pk)
+        self.assertFalse(user.check_password('wrong'))
+        user.refresh_from_db()
+        self.assertEqual(user.password, self.user.password)
+        self.assertEqual(get_metric('password_rehash')['count'], 0)
+
+class JWTKeyRotationTests(TestCase):
+    def setUp(self):
+        keys_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, keys_dir, ignore_errors=True)
+        keys = override_settings(JWT_KEYS_DIR=keys_dir)
+        keys.enable()
+        self.addCleanup(keys.disable)
+
+    def generate(self, *args):
+        call_command('generate_jwt_key', *args, stdout=StringIO())
+
+    def backend(self, algorithm, active_kid):
+        return KeyRingTokenBackend(algorithm, *load_key_ring(settings.JWT_KEYS_DIR), active_kid)
+
+    def test_retired_key_still_verifies(self):
+        self.generate('old', '--algorithm', 'EdDSA')
+        old_token = self.backend('EdDSA', 'old').encode({'user_id': 1})
+
+        self.generate('new', '--algorithm', 'RS256')
+        with override_settings(JWT_ACTIVE_KID='new'):
+            self.generate('old', '--retire')
+        backend = self.backend('RS256', 'new')
+
+        self.assertEqual(backend.decode(old_token)['user_id'], 1)
+        self.assertEqual(backend.decode(backend.encode({'user_id': 2}))['user_id'], 2)
+        self.assertEqual(
+            sorted((key['kid'], key['alg']) for key in backend.get_jwks()['keys']),
+            [('new', 'RS256'), ('old', 'EdDSA')]
+        )
+
+    def test_unknown_kid_rejected(self):
+        self.generate('old', '--algorithm', 'EdDSA')
+        token = self.backend('EdDSA', 'old').encode({'user_id': 1})
+        (Path(settings.JWT_KEYS_DIR) / 'old.pem').unlink()
+        self.generate('new', '--algorithm', 'EdDSA')
+        with self.assertRaises(TokenBackendError):
+            self.backend('EdDSA', 'new').decode(token)
+
+class TokenBlacklistTests(TokenTestMixin, TestCase):
+    def test_blacklisted_on_another_worker(self):
+        token = CachedRefreshToken.for_user(self.user)
+        # A live marker left in this process's cache; the token is then
+        # blacklisted by another worker, whose signal handler cannot reach it
+        cache.set(LIVE_TOKEN_KEY.format(jti=token['jti']), True)
+        BlacklistedToken.objects.bulk_create([
+            BlacklistedToken(token=OutstandingToken.objects.get(jti=token['jti']))
+        ])
+        self.assertRejected(token)
+
+class SharedCacheTokenBlacklistTests(SharedCacheMixin, TokenTestMixin, TestCase):
+    def test_blacklisted_after_live_marker(self):
+        token = CachedRefreshToken.for_user(self.user)
+        self.assertTrue(cache.get(LIVE_TOKEN_KEY.format(jti=token['jti'])))
+        CachedRefreshToken(str(token)).blacklist()
+        self.assertIsNone(cache.get(LIVE_TOKEN_KEY.format(jti=token['jti'])))
+        self.assertRejected(token)
+
+class EmailOutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='outbox-admin@example.com',
+            username='outbox-admin@example.com',
+            password='password',
+            first_name='Outbox',
+            last_name='Admin',
+            user_level='administrator',
+        )
+        cls.user = User.objects.create_user(
+            email='outbox@example.com',
+            username='outbox@example.com',
+            password='password',
+            first_name='Outbox',
+            last_name='User',
+        )
+
+    def setUp(self):
+        outbox.pool.close()
+        self.addCleanup(outbox.pool.close)
+
+    def queue(self, **fields):
+        return outbox.queue_email('Subject', 'Your code is 123456', ['outbox@example.com'], user=self.user, **fields)
+
+    def test_claim_leases_message(self):
+        entry = self.queue()
+        self.assertEqual([claimed.pk for claimed in outbox.claim_due(10)], [entry.pk])
+        # Leased to the first worker
+        self.assertEqual(outbox.claim_due(10), [])
+        # Until the lease runs out, e.g. because that worker died
+        EmailOutbox.objects.filter(pk=entry.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([claimed.pk for claimed in outbox.claim_due(10)], [entry.pk])
+
+    def test_retry_after_connection_lost(self):
+        entry = self.queue(success_action='otp_sent')
+        send = mock.patch.object(
+            mail.get_connection().__class__, 'send_messages',
+            side_effect=[smtplib.SMTPServerDisconnected('Connection unexpectedly closed'), 1],
+        )
+        with send:
+            self.assertEqual(outbox.deliver_pending(), (0, 1))
+            entry.refresh_from_db()
+            self.assertEqual((entry.status, entry.attempts), ('pending', 1))
+            self.assertGreater(entry.next_attempt_at, timezone.now())
+            self.assertIsNone(outbox.pool.connection)
+
+            # Not due until the backoff has passed
+            self.assertEqual(outbox.deliver_pending(), (0, 0))
+            EmailOutbox.objects.filter(pk=entry.pk).update(next_attempt_at=timezone.now())
+            self.assertEqual(outbox.deliver_pending(), (1, 0))
+
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts, entry.body), ('sent', 2, ''))
+        self.assertTrue(ActivityLog.objects.filter(action='otp_sent', user=self.user).exists())
+
+    def test_purge(self):
+        old = timezone.now() - timedelta(days=settings.EMAIL_OUTBOX_RETENTION_DAYS + 1)
+        entries = {status: self.queue() for status in ('sent', 'failed', 'pending')}
+        for status, entry in entries.items():
+            EmailOutbox.objects.filter(pk=entry.pk).update(status=status, created_at=old)
+        recent = self.queue()
+        EmailOutbox.objects.filter(pk=recent.pk).update(status='sent')
+
+        call_command('purge_email_outbox', stdout=StringIO())
+        self.assertEqual(
+            set(EmailOutbox.objects.values_list('pk', flat=True)),
+            {entries['pending'].pk, recent.pk},
+        )
+
+    def test_admin_reset_password_response(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.post(
+            '/api/admin-reset-password/',
+            {'admin_password': 'password', 'email': self.user.email},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['email_notification'], {'sent': False, 'error': None, 'queued': True})
+        self.assertTrue(EmailOutbox.objects.filter(user=self.user, status='pending').exists())
+
+class SlidingWindowThrottleTests(TestCase):
+    """
+    PasswordResetRateThrottle: 3 an hour per email and 20 an hour per IP.
+    """
+
+    def setUp(self):
+        # The start of an hour window
+        self.now = 100 * 3600
+        self.factory = APIRequestFactory()
+
+    def allow(self, email, ip='10.0.0.1'):
+        request = Request(
+            self.factory.post('/', {'email': email}, format='json', REMOTE_ADDR=ip),
+            parsers=[JSONParser()],
+        )
+        throttle = PasswordResetRateThrottle()
+        throttle.timer = lambda: self.now
+        return throttle.allow_request(request, None)
+
+    def test_limit(self):
+        self.assertEqual([self.allow('limit@example.com') for _ in range(4)], [True, True, True, False])
+
+    def test_limit_per_email(self):
+        for _ in range(3):
+            self.allow('first@example.com')
+        self.assertTrue(self.allow('second@example.com'))
+        self.assertFalse(self.allow(' First@Example.com '))
+        # Another IP does not reset the email's count
+        self.assertFalse(self.allow('first@example.com', ip='10.0.0.2'))
+
+    def test_limit_per_ip(self):
+        allowed = [self.allow(f'user{i}@example.com') for i in range(21)]
+        self.assertEqual(allowed, [True] * 20 + [False])
+        self.assertTrue(self.allow('user0@example.com', ip='10.0.0.2'))
+
+    def test_window_slides(self):
+        for _ in range(3):
+            self.allow('slide@example.com')
+        self.now += 1800
+        self.assertFalse(self.allow('slide@example.com'))
+        # Half way through the next window the previous one counts half, 1.5
+        self.now += 3600
+        self.assertEqual([self.allow('slide@example.com') for _ in range(3)], [True, True, False])
+
+    def test_window_expires(self):
+        for _ in range(3):
+            self.allow('expire@example.com')
+        self.now += 2 * 3600
+        self.assertEqual([self.allow('expire@example.com') for _ in range(4)], [True, True, True, False])
+
+    def test_throttle_cache_must_be_shared(self):
+        self.assertEqual(check_throttle_cache(None), [])
+        with override_settings(CACHES={
+            **settings.CACHES,
+            'throttle': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        }):
+            self.assertEqual([error.id for error in check_throttle_cache(None)], ['base.E001'])
+
+class ActivityLogArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='archive@example.com',
+            username='archive@example.com',
+            password='password',
+            first_name='Archive',
+            last_name='Admin',
+            user_level='administrator',
+        )
+
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        directory = override_settings(ACTIVITY_LOG_ARCHIVE_DIR=location)
+        directory.enable()
+        self.addCleanup(directory.disable)
+        self.month = timezone.now().replace(day=15) - timedelta(days=365)
+
+    def log(self, created_at, action='login'):
+        return ActivityLog.objects.create(user=self.admin, action=action, created_at=created_at)
+
+    def archive(self):
+        call_command('archive_activity_logs', stdout=StringIO())
+
+    def test_moves_old_months(self):
+        old = [self.log(self.month), self.log(self.month, action='logout')]
+        recent = self.log(timezone.now())
+        self.archive()
+
+        self.assertEqual(list(ActivityLog.objects.values_list('pk', flat=True)), [recent.pk])
+        part, = archive.load_index()
+        self.assertEqual((part['rows'], part['first_id'], part['last_id']), (2, old[0].pk, old[1].pk))
+        path = archive.archive_dir() / part['file']
+        self.assertFalse(path.stat().st_mode & 0o222)
+        self.assertEqual([entry['id'] for entry in archive.read_part(part)], [log.pk for log in old])
+
+    def test_late_rows_get_new_part(self):
+        self.log(self.month)
+        self.archive()
+        late = self.log(self.month)
+        self.archive()
+
+        parts = archive.load_index()
+        self.assertEqual([part['file'].split('.')[1] for part in parts], ['part-001', 'part-002'])
+        self.assertEqual(parts[1]['first_id'], late.pk)
+        self.assertFalse(ActivityLog.objects.exists())
+
+    def test_query_archive(self):
+        self.log(self.month)
+        self.log(self.month, action='logout')
+        self.archive()
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        start = self.month.replace(day=1).date()
+        response = client.get('/api/activity-logs/archive/', {
+            'start': start.isoformat(),
+            'end': (start + timedelta(days=40)).isoformat(),
+            'action': 'logout',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+        entry, = response.json()['results']
+        self.assertEqual((entry['action'], entry['user']['email']), ('logout', self.admin.email))
+
+class ActivityLogSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='search@example.com',
+            username='search@example.com',
+            password='password',
+            first_name='Search',
+            last_name='Admin',
+            user_level='administrator',
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def search(self, text):
+        response = self.client.get('/api/activity-logs/', {'search': text, 'count': 'exact'})
+        self.assertEqual(response.status_code, 200)
+        return [entry['id'] for entry in response.json()['results']]
+
+    def test_finds_new_entries(self):
+        entry = log_activity('login', user=self.admin, details={'browser': 'Firefox'})
+        log_activity('login', user=self.admin, details={'browser': 'Chrome'})
+        self.assertEqual(self.search('firefox'), [entry.pk])
+
+    def test_deleted_entries_leave_index(self):
+        entry = log_activity('login', user=self.admin, details={'browser': 'Firefox'})
+        entry.delete()
+        self.assertEqual(self.search('firefox'), [])
+
+    def test_matches_people_by_prefix(self):
+        entry = log_activity('login', user=self.admin)
+        self.assertEqual(self.search('search@exa'), [entry.pk])
+        self.assertEqual(self.search('Sear Adm'), [entry.pk])
+
+    def test_edited_entries_reindexed(self):
+        entry = log_activity('login', user=self.admin, details={'browser': 'Firefox'})
+        entry.details = {'browser': 'Safari'}
+        entry.save()
+        self.assertEqual(self.search('firefox'), [])
+        self.assertEqual(self.search('safari'), [entry.pk])
+
+    def test_query_syntax_is_literal(self):
+        log_activity('login', user=self.admin, details={'browser': 'Firefox'})
+        for text in ('"', 'NEAR(', 'firefox OR', '*', '-'):
+            self.assertEqual(self.search(text), [], text)
+
+class ActivityLogCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='counts@example.com',
+            username='counts@example.com',
+            password='password',
+            first_name='Count',
+            last_name='Admin',
+            user_level='administrator',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def count(self, **params):
+        response = self.client.get('/api/activity-logs/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['count'], response.json()['count_estimated']
+
+    def test_cached_until_written(self):
+        log_activity('login', user=self.admin)
+        self.assertEqual(self.count(), (1, False))
+        # Bypasses the audit writer, so the cached count stands
+        ActivityLog.objects.create(user=self.admin, action='login')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.count(), (1, False))
+        log_activity('logout', user=self.admin)
+        self.assertEqual(self.count(), (3, False))
+
+    def test_filters_counted_separately(self):
+        log_activity('login', user=self.admin)
+        log_activity('logout', user=self.admin)
+        self.assertEqual(self.count(action='login'), (1, False))
+        self.assertEqual(self.count(), (2, False))
+
+    @override_settings(ACTIVITY_LOG_COUNT_ESTIMATE_THRESHOLD=2)
+    def test_estimated_above_threshold(self):
+        logs = [log_activity('login', user=self.admin) for _ in range(4)]
+        logs[1].delete()
+        # From the primary key range, so an upper bound
+        self.assertEqual(self.count(), (4, True))
+        self.assertEqual(self.count(count='exact'), (3, False))
+        # Filtered counts below the threshold stay exact
+        self.assertEqual(self.count(action='login'), (3, False))
+
+    @override_settings(ACTIVITY_LOG_COUNT_ESTIMATE_THRESHOLD=2)
+    def test_search_count_bounded(self):
+        for _ in range(5):
+            log_activity('login', user=self.admin, details={'browser': 'firefox'})
+        self.assertEqual(self.count(search='firefox'), (3, True))
+        self.assertEqual(self.count(search='firefox', count='exact'), (5, False))
+
+class ActivityLogColumnTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='columns@example.com',
+            username='columns@example.com',
+            password='password',
+            first_name='Column',
+            last_name='Admin',
+            user_level='administrator',
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def filter(self, **params):
+        response = self.client.get('/api/activity-logs/', params)
+        self.assertEqual(response.status_code, 200)
+        return [entry['id'] for entry in response.json()['results']]
+
+    def test_columns_from_details(self):
+        entry = log_activity('password_reset', user=self.admin, admin=self.admin, details={
+            'ip_address': ' 10.0.0.1 ', 'target_email': 'Someone@Example.com', 'reset_by_admin': True,
+        })
+        entry.refresh_from_db()
+        self.assertEqual(
+            (entry.ip_address, entry.target_email, entry.reset_by_admin),
+            ('10.0.0.1', 'someone@example.com', True)
+        )
+
+    def test_filters(self):
+        reset = log_activity('password_reset', user=self.admin, admin=self.admin, details={
+            'target_email': 'someone@example.com', 'reset_by_admin': True,
+        })
+        login = log_activity('login', user=self.admin, details={'ip_address': '10.0.0.1'})
+        self.assertEqual(self.filter(ip_address='10.0.0.1'), [login.pk])
+        self.assertEqual(self.filter(ip_address='not-an-ip'), [])
+        self.assertEqual(self.filter(target_email='SOMEONE@example.com'), [reset.pk])
+        self.assertEqual(self.filter(reset_by_admin='true'), [reset.pk])
+
+    def test_backfill(self):
+        entry = log_activity('login', user=self.admin, details={'ip_address': '10.0.0.1'})
+        ActivityLog.objects.filter(pk=entry.pk).update(ip_address=None)
+        out = StringIO()
+        call_command('backfill_activity_log_columns', stdout=out)
+        self.assertIn('updated 1', out.getvalue())
+        entry.refresh_from_db()
+        self.assertEqual(entry.ip_address, '10.0.0.1')
+
+class ActivityRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='rollup-admin@example.com',
+            username='rollup-admin@example.com',
+            password='password',
+            first_name='Rollup',
+            last_name='Admin',
+            user_level='administrator',
+        )
+        cls.user = User.objects.create_user(
+            email='rollup@example.com',
+            username='rollup@example.com',
+            password='password',
+            first_name='Rollup',
+            last_name='User',
+        )
+
+    def stored(self):
+        return set(ActivityRollup.objects.values_list('day', 'action', 'actor_id', 'target_id', 'count'))
+
+    def write(self):
+        log_activity('login', user=self.user)
+        log_activity('login', user=self.user)
+        log_activity('status_changed', admin=self.admin, user=self.user)
+
+    def test_incremented_on_write(self):
+        self.write()
+        today = timezone.localdate()
+        self.assertEqual(self.stored(), {
+            (today, 'login', self.user.pk, 0, 2),
+            (today, 'status_changed', self.admin.pk, self.user.pk, 1),
+        })
+
+    def test_rebuild(self):
+        self.write()
+        incremental = self.stored()
+        self.assertEqual(rollups.rebuild(), 2)
+        self.assertEqual(self.stored(), incremental)
+
+        # Written without the audit writer, so only counted by a rebuild
+        yesterday = timezone.now() - timedelta(days=1)
+        ActivityLog.objects.create(user=self.user, action='logout', created_at=yesterday)
+        call_command('rebuild_activity_rollups', stdout=StringIO())
+        self.assertEqual(self.stored(), incremental | {(timezone.localdate(yesterday), 'logout', self.user.pk, 0, 1)})
+
+    def test_analytics(self):
+        self.write()
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/api/activity-analytics/', {'days': 7, 'actor_id': self.admin.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['totals'], {'status_changed': 1})
+
+        response = client.get('/api/activity-analytics/', {'days': 7, 'action': 'login,logout'})
+        self.assertEqual(response.json()['totals'], {'login': 2})
+        self.assertEqual(
+            [(point['action'], point['count']) for point in response.json()['series']],
+            [('login', 2)],
+        )
+
+    def test_analytics_permission(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/activity-analytics/').status_code, 403)
+
+@override_settings(ACTIVITY_LOG_EXPORT_CHUNK_SIZE=2)
+class ActivityLogExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='export@example.com',
+            username='export@example.com',
+            password='password',
+            first_name='Export',
+            last_name='Admin',
+            user_level='administrator',
+        )
+        cls.logs = [log_activity('login', user=cls.admin) for _ in range(5)]
+
+    def test_wsgi_streams(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/api/activity-logs/export/', {'export_format': 'ndjson'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.is_async)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [log.pk for log in reversed(self.logs)])
+
+    async def test_asgi_streams(self):
+        access = await sync_to_async(lambda: str(CachedRefreshToken.for_user(self.admin).access_token))()
+        response = await AsyncClient().get(
+            '/api/activity-logs/export/', {'export_format': 'csv'}, headers={'Authorization': f'Bearer {access}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        # An async iterator, so the ASGI handler does not read it into a list
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        # Two lines per chunk: the header and five rows
+        self.assertEqual(len(chunks), 3)
+        rows = list(csv.reader(b''.join(chunks).decode().splitlines()))
+        self.assertEqual(rows[0][:3], ['id', 'created_at', 'action'])
+        self.assertEqual([int(row[0]) for row in rows[1:]], [log.pk for log in reversed(self.logs)])
+
+@override_settings(ACTIVITY_FEED_POLL_SECONDS=0.01, ACTIVITY_FEED_HEARTBEAT_SECONDS=0.05)
+class ActivityFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='feed@example.com',
+            username='feed@example.com',
+            password='password',
+            first_name='Feed',
+            last_name='Admin',
+            user_level='administrator',
+        )
+        cls.first = log_activity('login', user=cls.admin)
+
+    async def next_event(self, events):
+        async def skip_heartbeats():
+            while (event := await anext(events)) is None:
+                pass
+            return event
+        return await asyncio.wait_for(skip_heartbeats(), 2)
+
+    def late_entry(self, offset):
+        # As if its transaction committed after that of a higher id
+        return ActivityLog(id=self.first.pk + offset, user=self.admin, action='login')
+
+    async def test_database_broker_sends_late_commits_once(self):
+        events = live.DatabaseBroker().listen({}, self.first.pk)
+        try:
+            await sync_to_async(self.late_entry(2).save)()
+            self.assertEqual((await self.next_event(events))['id'], self.first.pk + 2)
+            await sync_to_async(self.late_entry(1).save)()
+            self.assertEqual((await self.next_event(events))['id'], self.first.pk + 1)
+            # Nothing is sent twice; the next thing is a heartbeat
+            self.assertIsNone(await asyncio.wait_for(anext(events), 2))
+        finally:
+            await events.aclose()
+
+    async def test_in_process_broker_sends_late_commits_once(self):
+        broker = live.InProcessBroker()
+        events = broker.listen({}, self.first.pk)
+        try:
+            # The first heartbeat comes once it has subscribed
+            self.assertIsNone(await asyncio.wait_for(anext(events), 2))
+            broker.publish([self.late_entry(2)])
+            self.assertEqual((await self.next_event(events))['id'], self.first.pk + 2)
+            broker.publish([self.late_entry(1), self.late_entry(2)])
+            self.assertEqual((await self.next_event(events))['id'], self.first.pk + 1)
+            self.assertIsNone(await asyncio.wait_for(anext(events), 2))
+        finally:
+            await events.aclose()
+
+    @override_settings(ACTIVITY_FEED_AUTH_RECHECK_SECONDS=0)
+    async def test_stream_ends_when_admin_demoted(self):
+        access = await sync_to_async(lambda: str(CachedRefreshToken.for_user(self.admin).access_token))()
+        response = await AsyncClient().get(
+            '/api/activity-logs/stream/', headers={'Authorization': f'Bearer {access}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        chunks = response.streaming_content
+        self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+        self.assertEqual(await asyncio.wait_for(anext(chunks), 2), b': keepalive\n\n')
+
+        await User.objects.filter(pk=self.admin.pk).aupdate(user_level='division_chief')
+        await sync_to_async(bump_auth_version)(self.admin.pk)
+        with self.assertRaises(StopAsyncIteration):
+            await asyncio.wait_for(anext(chunks), 2)
+
+class LoginBookkeepingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='login@example.com',
+            username='login@example.com',
+            password=settings.DEFAULT_USER_PASSWORD,
+            first_name='Login',
+            last_name='User',
+        )
+
+    def login(self):
+        response = APIClient().post(
+            '/api/login/', {'email': self.user.email, 'password': settings.DEFAULT_USER_PASSWORD}
+        )
+        self.assertEqual(response.status_code, 200)
+        return User.objects.get(pk=self.user.pk)
+
+    def test_repeat_login_skips_user_writes(self):
+        first = self.login().last_login
+        self.assertIsNotNone(first)
+        with CaptureQueriesContext(connection) as queries:
+            user = self.login()
+        self.assertTrue(user.using_default_password)
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "base_user"')]
+        self.assertEqual(updates, [])
+
+    def test_last_login_written_after_interval(self):
+        stale = timezone.now() - timedelta(minutes=settings.LAST_LOGIN_UPDATE_MINUTES + 1)
+        User.objects.filter(pk=self.user.pk).update(last_login=stale)
+        self.assertGreater(self.login().last_login, stale)
+
+    def test_default_password_flag_corrected(self):
+        User.objects.filter(pk=self.user.pk).update(using_default_password=False)
+        self.assertTrue(self.login().using_default_password)
@@ -0,0 +1,92 @@
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle
+
+from .utils import get_client_ip
+
+# Shared by every worker; see base.checks
+THROTTLE_CACHE = 'throttle'
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Sliding-window counter kept in the THROTTLE_CACHE cache, applied per
+    client IP and per target email.
+
+    Each identity has one counter per fixed window; the current estimate is
+    the current count plus the previous window's count weighted by how much
+    of it still overlaps the sliding window. A check is one get_many and,
+    when allowed, one incr per identity, and gives the same answer on every
+    worker that shares the cache. Throttled requests are rejected before the
+    view runs, so they never reach the password hasher or the database.
+
+    The ``scope`` rate limits each email; ``<scope>_ip`` (if configured)
+    limits each IP address, falling back to the scope rate.
+    """
+    cache_format = 'ratelimit:%(scope)s:%(ident)s:%(window)s'
+    email_fields = ('email',)
+
+    def __init__(self):
+        super().__init__()
+        self.cache = caches[THROTTLE_CACHE]
+        self.ip_rate = self.parse_rate(self.THROTTLE_RATES.get(f'{self.scope}_ip', self.rate))
+        self.wait_seconds = None
+
+    def get_email(self, request):
+        for field in self.email_fields:
+            value = request.data.get(field)
+            if value:
+                return str(value).strip().lower()
+        return None
+
+    def get_limits(self, request):
+        limits = [(f'ip:{get_client_ip(request)}', *self.ip_rate)]
+        email = self.get_email(request)
+        if email:
+            limits.append((f'email:{email}', self.num_requests, self.duration))
+        return limits
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        now = self.timer()
+        windows = []
+        for ident, num_requests, duration in self.get_limits(request):
+            window = int(now // duration)
+            current = self.cache_format % {'scope': self.scope, 'ident': ident, 'window': window}
+            previous = self.cache_format % {'scope': self.scope, 'ident': ident, 'window': window - 1}
+            windows.append((current, previous, num_requests, duration))
+
+        counts = self.cache.get_many([key for window in windows for key in window[:2]])
+
+        self.wait_seconds = None
+        for current, previous, num_requests, duration in windows:
+            elapsed = (now % duration) / duration
+            estimate = counts.get(previous, 0) * (1 - elapsed) + counts.get(current, 0)
+            if estimate >= num_requests:
+                remaining = duration - (now % duration)
+                self.wait_seconds = max(self.wait_seconds or 0, remaining)
+
+        if self.wait_seconds is not None:
+            return False
+
+        for current, previous, num_requests, duration in windows:
+            # Counters must outlive their window to serve as "previous"
+            self.cache.add(current, 0, duration * 2)
+            try:
+                self.cache.incr(current)
+            except ValueError:
+                self.cache.set(current, 1, duration * 2)
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+class LoginRateThrottle(SlidingWindowThrottle):
+    scope = 'login'
+    email_fields = ('id_number', 'email')
+
+class PasswordResetRateThrottle(SlidingWindowThrottle):
+    scope = 'password_reset'
+
+class PasswordResetVerifyRateThrottle(SlidingWindowThrottle):
+    scope = 'password_reset_verify'
@@ -0,0 +1,112 @@
+from django.core.cache import cache
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .authentication import get_auth_version, get_cached_user
+from .caches import is_shared_cache
+from .jwt_keys import get_token_backend
+
+LIVE_TOKEN_KEY = 'jwt:live:{jti}'
+BLACKLISTED_TOKEN_KEY = 'jwt:blacklisted:{jti}'
+
+def _seconds_until(expires_at):
+    return max(1, int((expires_at - timezone.now()).total_seconds()))
+
+def mark_token_live(jti, expires_at):
+    if is_shared_cache():
+        cache.set(LIVE_TOKEN_KEY.format(jti=jti), True, _seconds_until(expires_at))
+
+def mark_token_blacklisted(jti, expires_at):
+    cache.delete(LIVE_TOKEN_KEY.format(jti=jti))
+    cache.set(BLACKLISTED_TOKEN_KEY.format(jti=jti), True, _seconds_until(expires_at))
+
+def is_token_blacklisted(jti):
+    """
+    Answer from the cache when it knows the token, otherwise ask the database.
+
+    Blacklisting is permanent, so a cached "blacklisted" answer is always
+    right. A "live" marker is deleted when its token is blacklisted, which
+    only reaches the other workers through a shared cache; with a
+    process-local one the markers are neither written nor trusted, so a
+    token rotated on one worker cannot be replayed on another.
+    """
+    live_key = LIVE_TOKEN_KEY.format(jti=jti)
+    blacklisted_key = BLACKLISTED_TOKEN_KEY.format(jti=jti)
+    known = cache.get_many([live_key, blacklisted_key])
+    if blacklisted_key in known:
+        return True
+    if live_key in known and is_shared_cache():
+        return False
+    return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+def identity_claims(user):
+    """
+    Claims that let other services authorize a request from the token alone.
+    """
+    return {
+        'user_level': user.user_level,
+        'status': user.status,
+        'auth_version': get_auth_version(user.pk),
+    }
+
+class KeyRingTokenMixin:
+    """
+    Sign and verify through base.jwt_keys, which adds kid-based key rotation
+    when an asymmetric JWT_ALGORITHM is configured.
+    """
+
+    @property
+    def token_backend(self):
+        return get_token_backend()
+
+class KeyedAccessToken(KeyRingTokenMixin, AccessToken):
+    pass
+
+class CachedRefreshToken(KeyRingTokenMixin, RefreshToken):
+    """
+    Refresh token whose blacklist membership is checked against the cache
+    before falling back to the token_blacklist tables (see
+    is_token_blacklisted).
+    """
+
+    access_token_class = KeyedAccessToken
+
+    def check_blacklist(self):
+        if is_token_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError('Token is blacklisted')
+
+    def outstand(self):
+        result = super().outstand()
+        self._mark_live()
+        return result
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.payload.update(identity_claims(user))
+        token._mark_live()
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        # Re-read the identity claims so a refreshed access token reflects
+        # status or role changes made since the refresh token was issued
+        user = get_cached_user(self.payload.get(api_settings.USER_ID_CLAIM))
+        if user is not None:
+            access.payload.update(identity_claims(user))
+        return access
+
+    def _mark_live(self):
+        mark_token_live(self.payload[api_settings.JTI_CLAIM], datetime_from_epoch(self.payload['exp']))
+
+@receiver(post_save, sender=BlacklistedToken)
+def cache_blacklisted_token(sender, instance, created, **kwargs):
+    if created:
+        mark_token_blacklisted(instance.token.jti, instance.token.expires_at)
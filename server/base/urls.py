@@ -2,6 +2,7 @@ from django.urls import path
 from .views import (
     CustomTokenObtainPairView,
     CustomTokenRefreshView,
+    jwks,
     logout,
     register,
     is_logged_in,
@@ -9,6 +10,10 @@ from .views import (
     update_user,
     change_user_status,
     get_activity_logs,
+    get_archived_activity_logs,
+    export_activity_logs,
+    activity_feed,
+    get_activity_analytics,
     get_todos,
     update_avatar,
     get_my_profile,
@@ -25,6 +30,7 @@ urlpatterns = [
     path('token/refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
     path('authenticated/', is_logged_in, name='check_auth'),
     path('logout/', logout, name='logout'),
+    path('.well-known/jwks.json', jwks, name='jwks'),
     
     # Password reset endpoints (new)
     path('request-password-reset/', request_password_reset, name='request_password_reset'),
@@ -38,6 +44,10 @@ urlpatterns = [
     path('users/<int:pk>/', update_user, name='update_user'),
     path('users/<int:pk>/status/', change_user_status, name='change_user_status'),
     path('activity-logs/', get_activity_logs, name='get_activity_logs'),
+    path('activity-logs/archive/', get_archived_activity_logs, name='get_archived_activity_logs'),
+    path('activity-logs/export/', export_activity_logs, name='export_activity_logs'),
+    path('activity-logs/stream/', activity_feed, name='activity_feed'),
+    path('activity-analytics/', get_activity_analytics, name='get_activity_analytics'),
 
     # Profile endpoints
     path('me/', get_my_profile, name='get_my_profile'),
@@ -1,40 +1,41 @@
+from .audit import writer
 from .models import ActivityLog
 
-def log_admin_action(admin_user, action, user=None, details=None):
+def get_client_ip(request):
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        ip = x_forwarded_for.split(',')[0]
+    else:
+        ip = request.META.get('REMOTE_ADDR')
+    return ip
+
+def log_activity(action, user=None, admin=None, details=None, durable=False):
     """
-    Log an admin action to the activity log
+    Queue an activity log entry for the buffered writer. Pass durable=True
+    for entries that must be stored before the request returns.
     """
-    ActivityLog.objects.create(
-        admin=admin_user,
-        user=user,
-        action=action,
-        details=details or {}
+    return writer.write(
+        ActivityLog(admin=admin, user=user, action=action, details=details or {}),
+        durable=durable
     )
 
+def log_admin_action(admin_user, action, user=None, details=None, durable=False):
+    """
+    Log an admin action to the activity log
+    """
+    log_activity(action, user=user, admin=admin_user, details=details, durable=durable)
+
 def log_user_login(user, ip_address=None):
     details = {}
     if ip_address:
         details['ip_address'] = ip_address
-    ActivityLog.objects.create(
-        user=user,
-        action='login',
-        details=details
-    )
+    log_activity('login', user=user, details=details)
 
 def log_user_logout(user):
-    ActivityLog.objects.create(
-        user=user,
-        action='logout'
-    )
+    log_activity('logout', user=user)
 
 def log_avatar_update(user):
-    ActivityLog.objects.create(
-        user=user,
-        action='avatar_updated'
-    )
+    log_activity('avatar_updated', user=user)
 
 def log_profile_update(user):
-    ActivityLog.objects.create(
-        user=user,
-        action='profile_updated'
-    )
\ No newline at end of file
+    log_activity('profile_updated', user=user)
\ No newline at end of file
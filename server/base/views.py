@@ -1,52 +1,65 @@
+import csv
+import ipaddress
+import json
 import os
+import time
+from contextlib import aclosing
 from datetime import datetime, timedelta
+from itertools import islice
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.core.mail import EmailMessage, EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import generics
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, throttle_classes
 from rest_framework.exceptions import PermissionDenied, AuthenticationFailed
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from .models import Todo, User, ActivityLog, PasswordResetOTP
+from .authentication import CookiesJWTAuthentication, bump_auth_version, get_cached_user
+from .jwt_keys import get_token_backend, is_asymmetric
+from . import archive, counts, fts, live
+from .metrics import timed
+from .pagination import CountedPaginator, InvalidCursor, KeysetPaginator, parse_page_size
+from .outbox import queue_account_created_emails, queue_admin_password_reset_emails, queue_email
+from .throttling import LoginRateThrottle, PasswordResetRateThrottle, PasswordResetVerifyRateThrottle
+from .utils import get_client_ip, log_activity
+from .models import Todo, User, ActivityLog, ActivityRollup, PasswordResetOTP
 from .serializers import (
     TodoSerializer, 
     UserRegisterSerializer, 
     UserSerializer, 
     ActivityLogSerializer,
     PasswordResetRequestSerializer,
-    PasswordResetVerifySerializer
+    PasswordResetVerifySerializer,
+    CustomTokenObtainPairSerializer,
+    CustomTokenRefreshSerializer
 )
-from django.core.paginator import Paginator, EmptyPage
-from django.db.models import Q
+from django.core.paginator import EmptyPage
+from django.db.models import Sum
 import random
 
 class CustomTokenObtainPairView(TokenObtainPairView):
+    serializer_class = CustomTokenObtainPairSerializer
+    throttle_classes = [LoginRateThrottle]
+
     def post(self, request, *args, **kwargs):
         try:
-            request.data['email'] = request.data.get('id_number', request.data.get('email'))
-            serializer = self.get_serializer(data=request.data)
+            data = request.data.copy()
+            data['email'] = data.get('id_number', data.get('email'))
+            serializer = self.get_serializer(data=data)
             serializer.is_valid(raise_exception=True)
             user = serializer.user
+            tokens = serializer.validated_data
+            using_default_password = tokens['using_default_password']
 
-            if user.status != 'active':
-                return Response({
-                    'success': False,
-                    'message': 'Your account is not active.'
-                }, status=403)
-
-            response = super().post(request, *args, **kwargs)
-            tokens = response.data
-
-            # Check if password is default
-            using_default_password = user.using_default_password
-
-            ActivityLog.objects.create(
+            log_activity(
                 user=user,
                 action='login',
                 details={
@@ -84,6 +97,12 @@ class CustomTokenObtainPairView(TokenObtainPairView):
                 'message': 'Invalid email or password.'
             }, status=400)
 
+        except PermissionDenied as e:
+            return Response({
+                'success': False,
+                'message': str(e.detail)
+            }, status=403)
+
         except Exception as e:
             print(e)
             return Response({
@@ -92,15 +111,11 @@ class CustomTokenObtainPairView(TokenObtainPairView):
             }, status=400)
 
     def _get_client_ip(self, request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+        return get_client_ip(request)
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([PasswordResetRateThrottle])
 def request_password_reset(request):
     serializer = PasswordResetRequestSerializer(data=request.data)
     if not serializer.is_valid():
@@ -120,12 +135,13 @@ def request_password_reset(request):
             'message': 'If this email exists in our system, you will receive a password reset OTP'
         })
 
-    # Invalidate any existing OTPs
-    PasswordResetOTP.objects.filter(user=user).update(is_used=True)
+    # Invalidate any outstanding OTPs
+    PasswordResetOTP.objects.filter(user=user, is_used=False).update(is_used=True)
 
     # Generate 6-digit OTP
     otp = str(random.randint(100000, 999999))
-    expires_at = timezone.now() + timedelta(minutes=15)
+    expiry_minutes = settings.PASSWORD_RESET_OTP_EXPIRE_MINUTES
+    expires_at = timezone.now() + timedelta(minutes=expiry_minutes)
 
     # Create new OTP record
     PasswordResetOTP.objects.create(
@@ -138,7 +154,7 @@ def request_password_reset(request):
     context = {
         'user': user,
         'otp_code': otp,
-        'expiry_minutes': 15,
+        'expiry_minutes': expiry_minutes,
         'reset_url': settings.FRONTEND_RESET_URL,
         'support_email': settings.SUPPORT_EMAIL,
         'system_name': settings.SYSTEM_NAME
@@ -149,58 +165,31 @@ def request_password_reset(request):
     html_message = render_to_string('email/password_reset_otp.html', context)
     text_message = strip_tags(html_message)
 
-    # Create and send email
-    try:
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=text_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[user.email],
-            reply_to=[settings.SUPPORT_EMAIL]
-        )
-        email.attach_alternative(html_message, "text/html")
-        email.send(fail_silently=False)
-
-        # Log OTP sent
-        ActivityLog.objects.create(
-            user=user,
-            action='otp_sent',
-            details={
-                'email': user.email,
-                'ip_address': request.META.get('REMOTE_ADDR'),
-                'otp_masked': f"{otp[:2]}****{otp[-2:]}"  # Log masked OTP for security
-            }
-        )
-
-        return Response({
-            'success': True,
-            'message': 'If this email exists in our system, you will receive a password reset OTP'
-        })
-    
-    except Exception as e:
-        # Detailed error logging
-        error_msg = f"Failed to send OTP email to {user.email}: {str(e)}"
-        print(error_msg)
-        
-        # Log the email failure
-        ActivityLog.objects.create(
-            user=user,
-            action='otp_send_failed',
-            details={
-                'email': user.email,
-                'error': str(e),
-                'ip_address': request.META.get('REMOTE_ADDR')
-            }
-        )
+    # Queue email; the outbox worker logs otp_sent / otp_send_failed
+    queue_email(
+        subject=subject,
+        body=text_message,
+        html_body=html_message,
+        to=[user.email],
+        reply_to=[settings.SUPPORT_EMAIL],
+        user=user,
+        success_action='otp_sent',
+        failure_action='otp_send_failed',
+        log_details={
+            'email': user.email,
+            'ip_address': request.META.get('REMOTE_ADDR'),
+            'otp_masked': f"{otp[:2]}****{otp[-2:]}"  # Log masked OTP for security
+        }
+    )
 
-        return Response({
-            'success': False,
-            'message': 'Failed to send OTP email. Please try again later.',
-            'error': str(e) if settings.DEBUG else None
-        }, status=500)
+    return Response({
+        'success': True,
+        'message': 'If this email exists in our system, you will receive a password reset OTP'
+    })
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([PasswordResetVerifyRateThrottle])
 def verify_password_reset(request):
     serializer = PasswordResetVerifySerializer(data=request.data)
     if not serializer.is_valid():
@@ -212,7 +201,7 @@ def verify_password_reset(request):
 
     try:
         user = serializer.validated_data['email']
-        otp = serializer.validated_data['otp']
+        otp_record = serializer.validated_data['otp_record']
         new_password = serializer.validated_data['new_password']
         
         # Password validation
@@ -222,15 +211,14 @@ def verify_password_reset(request):
                 'message': 'Password must be at least 8 characters'
             }, status=400)
 
-        # OTP validation
-        otp_record = PasswordResetOTP.objects.filter(
-            user=user,
-            otp=otp,
-            is_used=False,
-            expires_at__gt=timezone.now()
-        ).first()
+        # Consume the OTP the serializer found; the conditional update makes
+        # sure a code can only be redeemed once
+        consumed = PasswordResetOTP.objects.filter(
+            pk=otp_record.pk,
+            is_used=False
+        ).update(is_used=True)
 
-        if not otp_record:
+        if not consumed:
             return Response({
                 'success': False,
                 'message': 'Invalid or expired OTP'
@@ -239,10 +227,7 @@ def verify_password_reset(request):
         # Update password
         user.set_password(new_password)
         user.save()
-
-        # Invalidate OTP
-        otp_record.is_used = True
-        otp_record.save()
+        bump_auth_version(user.id)
 
         return Response({
             'success': True,
@@ -272,11 +257,14 @@ def is_logged_in(request):
     })
 
 class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer
+
     def post(self, request, *args, **kwargs):
         try:
             refresh_token = request.COOKIES.get('refresh_token')
             request.data['refresh'] = refresh_token
-            response = super().post(request, *args, **kwargs)
+            with timed('token_refresh'):
+                response = super().post(request, *args, **kwargs)
 
             res = Response({'refreshed': True})
             res.set_cookie(
@@ -292,11 +280,20 @@ class CustomTokenRefreshView(TokenRefreshView):
             print(e)
             return Response({'refreshed': False}, status=400)
 
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def jwks(request):
+    keys = get_token_backend().get_jwks() if is_asymmetric() else {'keys': []}
+    res = Response(keys)
+    res['Cache-Control'] = 'public, max-age=300'
+    return res
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def logout(request):
     try:
-        ActivityLog.objects.create(
+        log_activity(
             user=request.user,
             action='logout'
         )
@@ -332,7 +329,7 @@ def register(request):
         try:
             user = serializer.save()
             
-            ActivityLog.objects.create(
+            log_activity(
                 admin=request.user,
                 user=user,
                 action='user_created',
@@ -345,30 +342,8 @@ def register(request):
                 }
             )
 
-            # Send account creation email
-            subject = 'Your IERMS Account Has Been Created'
-            html_message = render_to_string('email/account_created.html', {
-                'user': user,
-                'admin': request.user,
-                'default_password': settings.DEFAULT_USER_PASSWORD,
-                'login_url': settings.FRONTEND_LOGIN_URL
-            })
-            plain_message = strip_tags(html_message)
-            
-            try:
-                # Use EmailMessage for better control
-                email = EmailMessage(
-                    subject,
-                    plain_message,
-                    settings.EMAIL_HOST_USER,
-                    [user.email],
-                )
-                email.content_subtype = "html"
-                email.body = html_message
-                email.send(fail_silently=False)
-            except Exception as e:
-                print(f"Error sending account creation email: {e}")
-                # Don't fail the request if email fails
+            # Queue account creation email
+            queue_account_created_emails([user], request.user)
             
             return Response({
                 'success': True,
@@ -404,17 +379,20 @@ def delete_user(request, pk):
             'message': 'User not found'
         }, status=404)
     
-    ActivityLog.objects.create(
+    log_activity(
         admin=request.user,
         user=user,
         action='user_deleted',
         details={
             'email': user.email,
             'user_level': user.user_level
-        }
+        },
+        durable=True
     )
     
+    user_id = user.id
     user.delete()
+    bump_auth_version(user_id)
     
     return Response({
         'success': True,
@@ -461,6 +439,7 @@ def update_user(request, pk):
     serializer = UserSerializer(user, data=request.data, partial=True)
     if serializer.is_valid():
         serializer.save()
+        bump_auth_version(user.id)
         
         updated_user = User.objects.get(pk=pk)
         updated_data = {
@@ -481,7 +460,7 @@ def update_user(request, pk):
                 }
         
         if changes:
-            ActivityLog.objects.create(
+            log_activity(
                 admin=request.user,
                 user=user,
                 action='user_updated',
@@ -529,8 +508,9 @@ def change_user_status(request, pk):
     original_status = user.status
     user.status = status
     user.save()
+    bump_auth_version(user.id)
     
-    ActivityLog.objects.create(
+    log_activity(
         admin=request.user,
         user=user,
         action='status_changed',
@@ -539,7 +519,8 @@ def change_user_status(request, pk):
             'to': status,
             'email': user.email,
             'full_name': f"{user.first_name} {user.last_name}"
-        }
+        },
+        durable=True
     )
     
     return Response({
@@ -601,13 +582,14 @@ def admin_reset_password(request):
 
     # Verify admin password
     if not request.user.check_password(admin_password):
-        ActivityLog.objects.create(
+        log_activity(
             admin=request.user,
             action='admin_password_verification_failed',
             details={
                 'attempted_action': 'password_reset',
                 'target_email': email
-            }
+            },
+            durable=True
         )
         return Response({
             'success': False,
@@ -619,7 +601,7 @@ def admin_reset_password(request):
     try:
         user = User.objects.get(email__iexact=email.lower())
     except User.DoesNotExist:
-        ActivityLog.objects.create(
+        log_activity(
             admin=request.user,
             action='password_reset_attempt_failed',
             details={
@@ -635,7 +617,7 @@ def admin_reset_password(request):
 
     # Check if user is active
     if user.status != 'active':
-        ActivityLog.objects.create(
+        log_activity(
             admin=request.user,
             action='password_reset_attempt_failed',
             details={
@@ -654,9 +636,10 @@ def admin_reset_password(request):
     default_password = settings.DEFAULT_USER_PASSWORD
     user.set_password(default_password)
     user.save()
+    bump_auth_version(user.id)
 
     # Log the password reset
-    ActivityLog.objects.create(
+    log_activity(
         admin=request.user,
         user=user,
         action='password_reset',
@@ -665,56 +648,12 @@ def admin_reset_password(request):
             'reset_to_default': True,
             'target_email': user.email,
             'target_name': f"{user.first_name} {user.last_name}"
-        }
+        },
+        durable=True
     )
 
-    # Send email notification
-    email_sent = False
-    email_error = None
-    
-    try:
-        context = {
-            'user': user,
-            'admin': request.user,
-            'default_password': default_password,
-            'login_url': settings.FRONTEND_LOGIN_URL,
-            'system_name': settings.SYSTEM_NAME,
-            'support_email': settings.SUPPORT_EMAIL,
-            'reset_time': timezone.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-
-        subject = f"{settings.SYSTEM_NAME} Password Reset Notification"
-        html_message = render_to_string('email/password_reset_by_admin.html', context)
-        text_message = strip_tags(html_message)
-
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=text_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[user.email],
-            reply_to=[settings.SUPPORT_EMAIL]
-        )
-        email.attach_alternative(html_message, "text/html")
-        email.send(fail_silently=False)
-        
-        email_sent = True
-        ActivityLog.objects.create(
-            user=user,
-            action='password_reset_email_sent',
-            details={'email': user.email}
-        )
-        
-    except Exception as e:
-        email_error = str(e)
-        ActivityLog.objects.create(
-            user=user,
-            action='password_reset_email_failed',
-            details={
-                'email': user.email,
-                'error': email_error
-            }
-        )
-        print(f"Failed to send password reset email: {email_error}")
+    # Queue email notification; the outbox worker logs the outcome
+    queue_admin_password_reset_emails([user], request.user)
 
     # Return success response
     response_data = {
@@ -727,9 +666,12 @@ def admin_reset_password(request):
             'status': user.status,
             'using_default_password': True
         },
+        # Delivered by the outbox worker after the response; 'sent' and
+        # 'error' are kept for existing clients
         'email_notification': {
-            'sent': email_sent,
-            'error': email_error
+            'sent': False,
+            'error': None,
+            'queued': True
         }
     }
 
@@ -747,7 +689,9 @@ def get_my_profile(request):
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated])
 def update_profile(request):
-    user = request.user
+    # request.user may be the cached identity; save a fresh row so that
+    # stale cached columns are not written back
+    user = User.objects.get(pk=request.user.pk)
     data = request.data.copy()
     
     if 'new_password' in data and data['new_password']:
@@ -765,13 +709,15 @@ def update_profile(request):
         
         user.set_password(data['new_password'])
         user.save()
+        bump_auth_version(user.id)
     
     # Handle other profile updates
     serializer = UserSerializer(user, data=data, partial=True, context={'request': request})
     if serializer.is_valid():
         serializer.save()
+        bump_auth_version(user.id)
         
-        ActivityLog.objects.create(
+        log_activity(
             user=user,
             action='profile_updated',
             details={
@@ -794,7 +740,7 @@ def update_profile(request):
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated])
 def update_avatar(request):
-    user = request.user
+    user = User.objects.get(pk=request.user.pk)
     avatar = request.FILES.get('avatar')
 
     if not avatar:
@@ -813,8 +759,9 @@ def update_avatar(request):
 
     user.avatar = avatar
     user.save()
+    bump_auth_version(user.id)
 
-    ActivityLog.objects.create(
+    log_activity(
         user=user,
         action='avatar_updated',
         details={
@@ -840,6 +787,40 @@ def get_todos(request):
     serializer = TodoSerializer(todos, many=True)
     return Response(serializer.data)
 
+def activity_log_filters(request):
+    return {
+        'action': request.query_params.get('action'),
+        'user_id': request.query_params.get('user_id'),
+        'admin_id': request.query_params.get('admin_id'),
+        'search': request.query_params.get('search'),
+        'ip_address': request.query_params.get('ip_address'),
+        'target_email': request.query_params.get('target_email'),
+        'reset_by_admin': request.query_params.get('reset_by_admin'),
+    }
+
+def filter_activity_logs(logs, filters):
+    """
+    Apply the activity log query filters shared by the listing and the export.
+    """
+    if filters['action']:
+        logs = logs.filter(action=filters['action'])
+    if filters['user_id']:
+        logs = logs.filter(user__id=filters['user_id'])
+    if filters['admin_id']:
+        logs = logs.filter(admin__id=filters['admin_id'])
+    if filters['ip_address']:
+        try:
+            logs = logs.filter(ip_address=str(ipaddress.ip_address(filters['ip_address'].strip())))
+        except ValueError:
+            logs = logs.none()
+    if filters['target_email']:
+        logs = logs.filter(target_email=filters['target_email'].strip().lower())
+    if filters['reset_by_admin'] in ('true', '1'):
+        logs = logs.filter(reset_by_admin=True)
+    if filters['search']:
+        logs = fts.search(logs, filters['search'])
+    return logs
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_activity_logs(request):
@@ -849,33 +830,45 @@ def get_activity_logs(request):
             'message': 'Only admin users can view activity logs'
         }, status=403)
     
-    action = request.query_params.get('action')
-    user_id = request.query_params.get('user_id')
-    admin_id = request.query_params.get('admin_id')
-    search = request.query_params.get('search')
+    filters = activity_log_filters(request)
+    search = filters['search']
+    logs = filter_activity_logs(ActivityLog.objects.select_related('admin', 'user'), filters)
     
-    logs = ActivityLog.objects.all().order_by('-created_at')
-    
-    if action:
-        logs = logs.filter(action=action)
-    if user_id:
-        logs = logs.filter(user__id=user_id)
-    if admin_id:
-        logs = logs.filter(admin__id=admin_id)
-    if search:
-        logs = logs.filter(
-            Q(user__email__icontains=search) |
-            Q(user__first_name__icontains=search) |
-            Q(user__last_name__icontains=search) |
-            Q(admin__email__icontains=search) |
-            Q(admin__first_name__icontains=search) |
-            Q(admin__last_name__icontains=search) |
-            Q(details__icontains=search)
+    if 'cursor' in request.query_params:
+        # Keyset mode: ?cursor= for the first page, then the returned tokens
+        paginator = KeysetPaginator(
+            logs,
+            ('-created_at', '-id'),
+            parse_page_size(request.query_params.get('page_size'))
         )
-    
+        try:
+            page_logs, next_cursor, previous_cursor = paginator.page(request.query_params['cursor'])
+        except InvalidCursor:
+            return Response({
+                'success': False,
+                'message': 'Invalid cursor'
+            }, status=400)
+
+        serializer = ActivityLogSerializer(page_logs, many=True)
+        return Response({
+            'results': serializer.data,
+            'next': next_cursor,
+            'previous': previous_cursor,
+            'page_size': paginator.page_size
+        })
+
+    # Page-number mode, kept for existing clients
     page = request.query_params.get('page', 1)
     page_size = request.query_params.get('page_size', 20)
-    paginator = Paginator(logs, page_size)
+    # Search results come best match first
+    ordering = ('-search_rank', '-created_at', '-id') if search else ('-created_at', '-id')
+    # Cached per filter set; estimated on large tables unless ?count=exact
+    count, count_estimated = counts.count_logs(
+        logs,
+        filters,
+        exact=request.query_params.get('count') == 'exact'
+    )
+    paginator = CountedPaginator(logs.order_by(*ordering), page_size, count)
     
     try:
         paginated_logs = paginator.page(page)
@@ -887,6 +880,272 @@ def get_activity_logs(request):
     return Response({
         'results': serializer.data,
         'count': paginator.count,
+        'count_estimated': count_estimated,
         'total_pages': paginator.num_pages,
         'current_page': paginated_logs.number
-    })
\ No newline at end of file
+    })
+
+def parse_range_bound(value, end=False):
+    """
+    Accept an ISO date or datetime; a plain end date includes that whole day.
+    """
+    if not value:
+        return None
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            moment = datetime.combine(day + timedelta(days=1) if end else day, datetime.min.time())
+    except ValueError:
+        return None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_archived_activity_logs(request):
+    """
+    Query activity logs that were moved to the archive. Reads the archive
+    files covering start..end, so keep the range to the months needed.
+    """
+    if request.user.user_level != 'administrator':
+        return Response({
+            'success': False,
+            'message': 'Only admin users can view activity logs'
+        }, status=403)
+
+    start = parse_range_bound(request.query_params.get('start'))
+    end = parse_range_bound(request.query_params.get('end'), end=True)
+    if start is None or end is None or start >= end:
+        return Response({
+            'success': False,
+            'message': 'start and end must be dates (YYYY-MM-DD) with start before end'
+        }, status=400)
+
+    try:
+        user_id = int(request.query_params.get('user_id') or 0) or None
+        admin_id = int(request.query_params.get('admin_id') or 0) or None
+        limit = min(max(int(request.query_params.get('limit', 100)), 1), 1000)
+    except ValueError:
+        return Response({
+            'success': False,
+            'message': 'user_id, admin_id and limit must be integers'
+        }, status=400)
+
+    entries, matched = archive.query(
+        start,
+        end,
+        action=request.query_params.get('action'),
+        user_id=user_id,
+        admin_id=admin_id,
+        limit=limit
+    )
+    return Response({
+        'results': entries,
+        'count': matched,
+        'truncated': matched > len(entries)
+    })
+
+ANALYTICS_USER_LEVELS = ('administrator', 'division_chief')
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_activity_analytics(request):
+    """
+    Daily activity counts for dashboard charts, read from the rollup table:
+    ?days=90 (up to 366), optional comma separated ?action= and ?actor_id=.
+    """
+    if request.user.user_level not in ANALYTICS_USER_LEVELS:
+        return Response({
+            'success': False,
+            'message': 'You do not have permission to view activity analytics'
+        }, status=403)
+
+    try:
+        days = min(max(int(request.query_params.get('days', 90)), 1), 366)
+        actor_id = int(request.query_params.get('actor_id') or 0)
+    except ValueError:
+        return Response({
+            'success': False,
+            'message': 'days and actor_id must be integers'
+        }, status=400)
+
+    end = timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    rollups = ActivityRollup.objects.filter(day__gte=start, day__lte=end)
+    actions = [action for action in request.query_params.get('action', '').split(',') if action]
+    if actions:
+        rollups = rollups.filter(action__in=actions)
+    if actor_id:
+        rollups = rollups.filter(actor_id=actor_id)
+
+    series = list(
+        rollups.values('day', 'action')
+        .annotate(count=Sum('count'))
+        .order_by('day', 'action')
+    )
+    totals = {}
+    for point in series:
+        totals[point['action']] = totals.get(point['action'], 0) + point['count']
+
+    return Response({
+        'success': True,
+        'start': start,
+        'end': end,
+        'series': series,
+        'totals': totals
+    })
+
+EXPORT_COLUMNS = [
+    'id', 'created_at', 'action',
+    'admin__email', 'admin__first_name', 'admin__last_name',
+    'user__email', 'user__first_name', 'user__last_name',
+    'details',
+]
+EXPORT_HEADERS = [
+    'id', 'created_at', 'action',
+    'admin_email', 'admin_first_name', 'admin_last_name',
+    'user_email', 'user_first_name', 'user_last_name',
+    'details',
+]
+
+class Echo:
+    """File-like object whose write() returns the value, for csv.writer."""
+    def write(self, value):
+        return value
+
+def export_rows(logs, export_format):
+    rows = logs.values_list(*EXPORT_COLUMNS).iterator(chunk_size=settings.ACTIVITY_LOG_EXPORT_CHUNK_SIZE)
+    if export_format == 'ndjson':
+        for row in rows:
+            record = dict(zip(EXPORT_HEADERS, row))
+            record['created_at'] = record['created_at'].isoformat()
+            yield json.dumps(record) + '\n'
+        return
+
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_HEADERS)
+    for row in rows:
+        row = list(row)
+        row[1] = row[1].isoformat()
+        row[-1] = json.dumps(row[-1])
+        yield writer.writerow(row)
+
+async def stream_export(rows):
+    """
+    Feed the export_rows() generator to an ASGI server a chunk at a time.
+    Given a sync iterator, Django's ASGI handler would collect the whole
+    export in a list before sending the first byte.
+    """
+    next_chunk = sync_to_async(lambda: ''.join(islice(rows, settings.ACTIVITY_LOG_EXPORT_CHUNK_SIZE)))
+    try:
+        while chunk := await next_chunk():
+            yield chunk
+    finally:
+        # Releases the database cursor when the client goes away early
+        await sync_to_async(rows.close)()
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_activity_logs(request):
+    """
+    Stream every activity log matching the listing filters as CSV or NDJSON
+    (?export_format=csv|ndjson), newest first, in constant memory.
+    """
+    if request.user.user_level != 'administrator':
+        return Response({
+            'success': False,
+            'message': 'Only admin users can export activity logs'
+        }, status=403)
+
+    export_format = request.query_params.get('export_format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return Response({
+            'success': False,
+            'message': 'export_format must be csv or ndjson'
+        }, status=400)
+
+    logs = filter_activity_logs(ActivityLog.objects.all(), activity_log_filters(request))
+    logs = logs.order_by('-created_at', '-id')
+
+    rows = export_rows(logs, export_format)
+    if isinstance(request._request, ASGIRequest):
+        rows = stream_export(rows)
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(rows, content_type=content_type)
+    filename = f"activity-logs-{timezone.now():%Y%m%d-%H%M%S}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def authenticate_request(request):
+    try:
+        result = CookiesJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+def can_view_feed(user):
+    return user is not None and user.is_active and user.status == 'active' and user.user_level == 'administrator'
+
+def parse_feed_filters(request):
+    return {
+        'actions': [action for action in request.GET.get('action', '').split(',') if action],
+        'user_id': int(request.GET.get('user_id') or 0) or None,
+        'admin_id': int(request.GET.get('admin_id') or 0) or None,
+    }
+
+async def activity_feed(request):
+    """
+    Server-sent events of new activity log entries for administrators.
+    Accepts the action (comma separated), user_id and admin_id filters;
+    a reconnecting client resumes after its Last-Event-ID header or
+    ?last_id, otherwise the feed starts with the next entry written.
+    """
+    user = await sync_to_async(authenticate_request)(request)
+    if user is None:
+        return JsonResponse({'success': False, 'message': 'Authentication required'}, status=401)
+    if not can_view_feed(user):
+        return JsonResponse({
+            'success': False,
+            'message': 'Only admin users can view activity logs'
+        }, status=403)
+
+    try:
+        filters = parse_feed_filters(request)
+        last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_id')
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'message': 'user_id, admin_id and last_id must be integers'
+        }, status=400)
+
+    if last_id is None:
+        # Fixed now rather than when the stream is first read
+        last_id = await sync_to_async(live.latest_id)()
+
+    async def stream():
+        # Lets the browser reconnect quickly after a dropped connection
+        yield 'retry: 3000\n\n'
+        checked = time.monotonic()
+        async with aclosing(live.get_broker().listen(filters, last_id)) as events:
+            async for event in events:
+                if time.monotonic() - checked >= settings.ACTIVITY_FEED_AUTH_RECHECK_SECONDS:
+                    # Status and role changes bump the auth version, which
+                    # get_cached_user() follows; a demoted or deactivated
+                    # admin's stream ends, and reconnecting is refused
+                    if not can_view_feed(await sync_to_async(get_cached_user)(user.pk)):
+                        return
+                    checked = time.monotonic()
+                if event is None:
+                    yield ': keepalive\n\n'
+                else:
+                    yield f"id: {event['id']}\nevent: activity\ndata: {json.dumps(event)}\n\n"
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -73,6 +73,29 @@ DATABASES = {
     }
 }
 
+# Cache (point CACHE_BACKEND/CACHE_LOCATION at Redis or Memcached when running
+# several workers so that cached state and invalidations are shared). On the
+# process-local default, authenticated users and refresh token blacklist
+# checks are read from the database instead of being cached (base/caches.py).
+#
+# Rate limit counters (base/throttling.py) must be shared by every worker, or
+# each one allows the full rate: they live in their own cache, a database
+# table created by migration 0012 unless THROTTLE_CACHE_BACKEND/
+# THROTTLE_CACHE_LOCATION point elsewhere. A process-local backend fails the
+# base.E001 system check.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+    'throttle': {
+        'BACKEND': os.getenv('THROTTLE_CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.getenv('THROTTLE_CACHE_LOCATION', 'throttle_cache'),
+        # Two counters per client IP and email; culling them would reset limits
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    },
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -92,6 +115,22 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing (run `python manage.py calibrate_hashers` to size these for
+# the host). Stored hashes are upgraded to the preferred hasher and cost on
+# each user's next successful login.
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'pbkdf2_sha256')
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', '0'))  # 0 = Django default
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.getenv('PASSWORD_SCRYPT_WORK_FACTOR', '0'))  # 0 = Django default
+_PASSWORD_HASHER_CLASSES = {
+    'pbkdf2_sha256': 'base.hashers.TunedPBKDF2PasswordHasher',
+    'scrypt': 'base.hashers.TunedScryptPasswordHasher',
+}
+PASSWORD_HASHERS = [
+    _PASSWORD_HASHER_CLASSES[PASSWORD_HASHER],
+    *[path for name, path in _PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER],
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -107,6 +146,7 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Custom user model
 AUTH_USER_MODEL = 'base.User'
 DEFAULT_USER_PASSWORD = os.getenv('DEFAULT_USER_PASSWORD', 'password123')
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', '300'))  # seconds
 
 EMAIL_TIMEOUT = 30  # seconds
 EMAIL_USE_SSL = False  # Must be False when using TLS
@@ -120,6 +160,46 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 
+# Email outbox (delivered by `python manage.py run_email_worker`)
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_LEASE_SECONDS = 300  # a claimed message is retried if its worker dies
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = 30
+EMAIL_OUTBOX_RETRY_MAX_SECONDS = 3600
+EMAIL_OUTBOX_RETENTION_DAYS = 7  # sent and failed messages kept this long by purge_email_outbox
+EMAIL_CONNECTION_MAX_IDLE_SECONDS = 60  # reuse one SMTP session across batches
+EMAIL_CONNECTION_MAX_MESSAGES = 100
+
+# Activity log writer (base/audit.py): entries are buffered in process and
+# bulk inserted every ACTIVITY_LOG_FLUSH_SECONDS or ACTIVITY_LOG_BATCH_SIZE
+# entries. Set ACTIVITY_LOG_BUFFERED=False to insert each entry immediately;
+# the test runner (core/test_runner.py) always does.
+ACTIVITY_LOG_BUFFERED = os.getenv('ACTIVITY_LOG_BUFFERED', 'True') == 'True'
+ACTIVITY_LOG_BATCH_SIZE = int(os.getenv('ACTIVITY_LOG_BATCH_SIZE', 100))
+ACTIVITY_LOG_FLUSH_SECONDS = float(os.getenv('ACTIVITY_LOG_FLUSH_SECONDS', 2))
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# Older months are moved to read-only archive files by archive_activity_logs
+# and stay queryable through /api/activity-logs/archive/.
+ACTIVITY_LOG_HOT_RETENTION_DAYS = int(os.getenv('ACTIVITY_LOG_HOT_RETENTION_DAYS', 180))
+ACTIVITY_LOG_ARCHIVE_DIR = os.getenv('ACTIVITY_LOG_ARCHIVE_DIR', str(BASE_DIR / 'archive' / 'activity_logs'))
+
+# Listing counts (base/counts.py): exact counts are cached briefly; above
+# the threshold, unfiltered and search counts are estimated.
+ACTIVITY_LOG_COUNT_CACHE_SECONDS = 30
+ACTIVITY_LOG_COUNT_ESTIMATE_THRESHOLD = 100_000
+ACTIVITY_LOG_EXPORT_CHUNK_SIZE = 2000  # rows fetched per round trip by the export
+
+# Live activity feed (/api/activity-logs/stream/, base/live.py). The default
+# DatabaseBroker sees entries from every process. base.live.InProcessBroker
+# pushes without polling but only sees entries written by its own process:
+# use it only with a single server process (one gunicorn/uvicorn worker).
+ACTIVITY_FEED_BROKER = os.getenv('ACTIVITY_FEED_BROKER', 'base.live.DatabaseBroker')
+ACTIVITY_FEED_POLL_SECONDS = 2  # DatabaseBroker only
+ACTIVITY_FEED_HEARTBEAT_SECONDS = 15
+ACTIVITY_FEED_QUEUE_SIZE = 100  # batches held per client before it falls back to the database
+ACTIVITY_FEED_OVERLAP_SECONDS = 10  # entries committing this much later than a higher id are still sent
+ACTIVITY_FEED_AUTH_RECHECK_SECONDS = 30  # a demoted or deactivated admin's stream ends within this
+
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -133,17 +213,34 @@ REST_FRAMEWORK = {
         'anon': '100/hour',
         'user': '1000/hour',
         'password_reset': '3/hour',
+        'password_reset_ip': '20/hour',
+        'password_reset_verify': '10/hour',
+        'password_reset_verify_ip': '30/hour',
+        'login': '10/minute',
+        'login_ip': '60/minute',
     },
     'EXCEPTION_HANDLER': 'rest_framework.views.exception_handler',
 }
 
+# JWT signing. HS256 signs with SECRET_KEY; RS256/EdDSA sign with the key ring
+# in JWT_KEYS_DIR (see base/jwt_keys.py) and publish public keys at
+# /api/.well-known/jwks.json so other services can verify tokens locally.
+JWT_ALGORITHM = os.getenv('JWT_ALGORITHM', 'HS256')
+JWT_KEYS_DIR = os.getenv('JWT_KEYS_DIR', str(BASE_DIR / 'jwt_keys'))
+JWT_ACTIVE_KID = os.getenv('JWT_ACTIVE_KID', '')
+
 # JWT Configuration (HTTP-compatible)
 SIMPLE_JWT = {
+    "ALGORITHM": JWT_ALGORITHM,
+    "ISSUER": os.getenv('JWT_ISSUER') or None,
+    "AUTH_TOKEN_CLASSES": ("base.tokens.KeyedAccessToken",),
     "ACCESS_TOKEN_LIFETIME": timedelta(hours=5),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
-    "UPDATE_LAST_LOGIN": True,
+    # last_login is written by the login serializer instead, at most once
+    # per LAST_LOGIN_UPDATE_MINUTES
+    "UPDATE_LAST_LOGIN": False,
     
     # Cookie settings for HTTP
     "AUTH_COOKIE": "access_token",
@@ -186,8 +283,11 @@ SESSION_COOKIE_SECURE = False
 CSRF_COOKIE_SECURE = False
 SECURE_SSL_REDIRECT = False
 
+LAST_LOGIN_UPDATE_MINUTES = int(os.getenv('LAST_LOGIN_UPDATE_MINUTES', 15))
+
 # Password Reset Settings
 PASSWORD_RESET_OTP_EXPIRE_MINUTES = 15
+PASSWORD_RESET_OTP_RETENTION_DAYS = 1  # used/expired codes kept this long by purge_password_reset_otps
 PASSWORD_RESET_TIMEOUT = 900  # 15 minutes in seconds
 
 # Logging Configuration (Production-appropriate)
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Write activity log entries synchronously: the buffered writer's thread
+    has its own connection, which does not see the test transaction.
+    Tests of the buffer itself override ACTIVITY_LOG_BUFFERED back on.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._activity_log_buffered = settings.ACTIVITY_LOG_BUFFERED
+        settings.ACTIVITY_LOG_BUFFERED = False
+
+    def teardown_test_environment(self, **kwargs):
+        settings.ACTIVITY_LOG_BUFFERED = self._activity_log_buffered
+        super().teardown_test_environment(**kwargs)
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Establishment, NatureOfBusiness, EstablishmentPolygon
+from .models import ClusterCell, Establishment, NatureOfBusiness, EstablishmentPolygon
+from .search import search
 
 @admin.register(NatureOfBusiness)
 class NatureOfBusinessAdmin(admin.ModelAdmin):
@@ -21,10 +22,29 @@ class EstablishmentAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
     actions = ['archive_establishments', 'unarchive_establishments']
 
+    def get_search_results(self, request, queryset, search_term):
+        # Use the search index rather than icontains on each search field
+        if not search_term.strip():
+            return queryset, False
+        return search(queryset, search_term), False
+
+    # Saved one at a time rather than with queryset.update() so the map
+    # clusters follow
     def archive_establishments(self, request, queryset):
-        queryset.update(is_archived=True)
+        for establishment in queryset.filter(is_archived=False):
+            establishment.is_archived = True
+            establishment.save()
     archive_establishments.short_description = "Archive selected establishments"
 
     def unarchive_establishments(self, request, queryset):
-        queryset.update(is_archived=False)
-    unarchive_establishments.short_description = "Unarchive selected establishments"
\ No newline at end of file
+        for establishment in queryset.filter(is_archived=True):
+            establishment.is_archived = False
+            establishment.save()
+    unarchive_establishments.short_description = "Unarchive selected establishments"
+
+@admin.register(ClusterCell)
+class ClusterCellAdmin(admin.ModelAdmin):
+    list_display = ('zoom', 'cell', 'nature_of_business_id', 'count')
+    list_filter = ('zoom',)
+    readonly_fields = ('zoom', 'cell', 'nature_of_business_id', 'count', 'latitude_sum', 'longitude_sum')
+    ordering = ('zoom', 'cell')
\ No newline at end of file
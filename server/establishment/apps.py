@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class EstablishmentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'establishment'
\ No newline at end of file
+    name = 'establishment'
+
+    def ready(self):
+        from . import clusters  # noqa: F401 (register signal handlers)
\ No newline at end of file
@@ -0,0 +1,246 @@
+"""
+Map marker clusters.
+
+For every zoom level from CLUSTER_MIN_ZOOM to CLUSTER_MAX_ZOOM the active
+establishments with coordinates are counted in ClusterCell rows per cell
+of a grid sized for that zoom (CELLS_PER_TILE cells across a map tile) and
+per nature of business. Creating, moving, archiving or deleting an
+establishment moves it from the cells it was in to the ones it is in now,
+so a clusters request reads a few rows per visible cell instead of the
+establishments themselves.
+
+bulk_create() and queryset.update() skip the signals that keep the cells
+current; run rebuild() (the rebuild_establishment_clusters command) after
+using them on establishments.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .geo import cell_ranges, grid_cell
+from .models import ClusterCell, Establishment, NatureOfBusiness
+
+CLUSTER_MIN_ZOOM = 4
+CLUSTER_MAX_ZOOM = 14
+# Across a 256 pixel tile, so a cluster covers about 64 pixels
+CELLS_PER_TILE = 4
+# Cells per statement, well below SQLite's expression depth limit
+BATCH_SIZE = 100
+
+TRACKED_FIELDS = ('latitude', 'longitude', 'nature_of_business_id', 'is_archived')
+
+def cell_degrees(zoom):
+    return 360 / 2 ** zoom / CELLS_PER_TILE
+
+def cell_bounds(cell, zoom):
+    """
+    [west, south, east, north] of a cell of the grid for ``zoom``.
+    """
+    degrees = cell_degrees(zoom)
+    row, column = divmod(cell, round(360 / degrees))
+    west, south = column * degrees - 180, row * degrees - 90
+    return [west, south, west + degrees, south + degrees]
+
+def position(values):
+    """
+    (latitude, longitude, nature_of_business_id) of an establishment from
+    its TRACKED_FIELDS values, or None when it is not on the map.
+    """
+    if values['is_archived'] or values['latitude'] is None or values['longitude'] is None:
+        return None
+    return float(values['latitude']), float(values['longitude']), values['nature_of_business_id'] or 0
+
+def current_values(establishment):
+    return {field: getattr(establishment, field) for field in TRACKED_FIELDS}
+
+def move(changes, place, sign):
+    """
+    Add (``sign`` 1) or remove (-1) an establishment at ``place`` to the
+    pending ``changes`` of every zoom level.
+    """
+    if place is None:
+        return
+    latitude, longitude, nature_of_business_id = place
+    for zoom in range(CLUSTER_MIN_ZOOM, CLUSTER_MAX_ZOOM + 1):
+        key = (zoom, grid_cell(latitude, longitude, cell_degrees(zoom)), nature_of_business_id)
+        count, latitude_sum, longitude_sum = changes[key]
+        changes[key] = (count + sign, latitude_sum + sign * latitude, longitude_sum + sign * longitude)
+
+def pending_changes():
+    return defaultdict(lambda: (0, 0.0, 0.0))
+
+def matching(keys):
+    condition = Q()
+    for zoom, cell, nature_of_business_id in keys:
+        condition |= Q(zoom=zoom, cell=cell, nature_of_business_id=nature_of_business_id)
+    return condition
+
+def apply(changes):
+    """
+    Add ``changes`` ({(zoom, cell, nature_of_business_id): (count,
+    latitude_sum, longitude_sum)}) to the stored cells. Cells with the same
+    change, e.g. all the cells one establishment leaves, share a statement.
+    """
+    groups = defaultdict(list)
+    for key, change in changes.items():
+        if any(change):
+            groups[change].append(key)
+
+    with transaction.atomic():
+        for (count, latitude_sum, longitude_sum), keys in groups.items():
+            update = dict(
+                count=F('count') + count,
+                latitude_sum=F('latitude_sum') + latitude_sum,
+                longitude_sum=F('longitude_sum') + longitude_sum,
+            )
+            for start in range(0, len(keys), BATCH_SIZE):
+                batch = keys[start:start + BATCH_SIZE]
+                if ClusterCell.objects.filter(matching(batch)).update(**update) == len(batch):
+                    continue
+                existing = set(
+                    ClusterCell.objects.filter(matching(batch))
+                    .values_list('zoom', 'cell', 'nature_of_business_id')
+                )
+                for zoom, cell, nature_of_business_id in batch:
+                    if (zoom, cell, nature_of_business_id) in existing:
+                        continue
+                    key = dict(zoom=zoom, cell=cell, nature_of_business_id=nature_of_business_id)
+                    try:
+                        with transaction.atomic():
+                            ClusterCell.objects.create(
+                                **key, count=count, latitude_sum=latitude_sum, longitude_sum=longitude_sum
+                            )
+                    except IntegrityError:
+                        # Another writer created the row first
+                        ClusterCell.objects.filter(**key).update(**update)
+
+def stored_position(establishment):
+    loaded = getattr(establishment, '_loaded_values', {})
+    if all(field in loaded for field in TRACKED_FIELDS):
+        return position(loaded)
+    # Loaded with only() or built by hand
+    values = Establishment.objects.filter(pk=establishment.pk).values(*TRACKED_FIELDS).first()
+    return position(values) if values else None
+
+@receiver(pre_save, sender=Establishment)
+def establishment_pre_save_handler(sender, instance, raw, **kwargs):
+    if raw or instance._state.adding:
+        instance._cluster_position = None
+    else:
+        instance._cluster_position = stored_position(instance)
+
+@receiver(post_save, sender=Establishment)
+def establishment_post_save_handler(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    values = current_values(instance)
+    before, after = instance._cluster_position, position(values)
+    # The next save starts from what was just written
+    instance._loaded_values = {**getattr(instance, '_loaded_values', {}), **values}
+    if before != after:
+        changes = pending_changes()
+        move(changes, before, -1)
+        move(changes, after, 1)
+        apply(changes)
+
+@receiver(post_delete, sender=Establishment)
+def establishment_post_delete_handler(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    values = loaded if all(field in loaded for field in TRACKED_FIELDS) else current_values(instance)
+    changes = pending_changes()
+    move(changes, position(values), -1)
+    apply(changes)
+
+@receiver(post_delete, sender=NatureOfBusiness)
+def nature_of_business_post_delete_handler(sender, instance, **kwargs):
+    # Its establishments were set to none with a plain UPDATE
+    cells = ClusterCell.objects.filter(nature_of_business_id=instance.pk)
+    changes = pending_changes()
+    for cell in cells:
+        changes[(cell.zoom, cell.cell, 0)] = (cell.count, cell.latitude_sum, cell.longitude_sum)
+    with transaction.atomic():
+        apply(changes)
+        cells.delete()
+
+def rebuild():
+    """
+    Recompute every cell from the establishments and return the number of
+    rows.
+    """
+    places = [
+        position(values)
+        for values in Establishment.objects.filter(
+            is_archived=False, latitude__isnull=False, longitude__isnull=False
+        ).values(*TRACKED_FIELDS).iterator(chunk_size=2000)
+    ]
+    rows = 0
+    with transaction.atomic():
+        ClusterCell.objects.all().delete()
+        # A zoom at a time, so only one level's cells are in memory
+        for zoom in range(CLUSTER_MIN_ZOOM, CLUSTER_MAX_ZOOM + 1):
+            degrees = cell_degrees(zoom)
+            changes = pending_changes()
+            for latitude, longitude, nature_of_business_id in places:
+                key = (zoom, grid_cell(latitude, longitude, degrees), nature_of_business_id)
+                count, latitude_sum, longitude_sum = changes[key]
+                changes[key] = (count + 1, latitude_sum + latitude, longitude_sum + longitude)
+            ClusterCell.objects.bulk_create(
+                [
+                    ClusterCell(
+                        zoom=zoom, cell=cell, nature_of_business_id=nature_of_business_id,
+                        count=count, latitude_sum=latitude_sum, longitude_sum=longitude_sum,
+                    )
+                    for (zoom, cell, nature_of_business_id), (count, latitude_sum, longitude_sum) in changes.items()
+                ],
+                batch_size=1000,
+            )
+            rows += len(changes)
+    return rows
+
+def viewport_clusters(west, south, east, north, zoom):
+    """
+    The clusters of the grid for ``zoom`` whose cells overlap the bounding
+    box: count, centroid, cell bounds and a breakdown by nature of
+    business, largest first.
+    """
+    rows = (
+        ClusterCell.objects.filter(
+            cell_ranges(west, south, east, north, field='cell', degrees=cell_degrees(zoom), zoom=zoom),
+            count__gt=0,
+        )
+        .values_list('cell', 'nature_of_business_id', 'count', 'latitude_sum', 'longitude_sum')
+    )
+    cells = {}
+    for cell, nature_of_business_id, count, latitude_sum, longitude_sum in rows:
+        totals = cells.setdefault(cell, {'count': 0, 'latitude_sum': 0.0, 'longitude_sum': 0.0, 'natures': defaultdict(int)})
+        totals['count'] += count
+        totals['latitude_sum'] += latitude_sum
+        totals['longitude_sum'] += longitude_sum
+        totals['natures'][nature_of_business_id] += count
+
+    names = dict(
+        NatureOfBusiness.objects.filter(
+            pk__in={nature for totals in cells.values() for nature in totals['natures']}
+        ).values_list('id', 'name')
+    )
+    result = []
+    for cell, totals in cells.items():
+        breakdown = defaultdict(int)
+        for nature_of_business_id, count in totals['natures'].items():
+            # Unknown ids belong to a nature of business deleted meanwhile
+            breakdown[nature_of_business_id if nature_of_business_id in names else None] += count
+        result.append({
+            'cell': cell,
+            'count': totals['count'],
+            'latitude': totals['latitude_sum'] / totals['count'],
+            'longitude': totals['longitude_sum'] / totals['count'],
+            'bounds': cell_bounds(cell, zoom),
+            'nature_of_business': [
+                {'id': nature_of_business_id, 'name': names.get(nature_of_business_id), 'count': count}
+                for nature_of_business_id, count in sorted(breakdown.items(), key=lambda item: -item[1])
+            ],
+        })
+    return result
@@ -0,0 +1,92 @@
+"""
+Bounding-box lookups for the establishment map.
+
+Every establishment with coordinates stores the grid cell it falls in:
+cells are GRID_DEGREES square and numbered row by row from the south-west
+corner of the world,
+
+    cell = row * columns + column
+
+so the cells of one row of a viewport are a contiguous range of numbers.
+in_bbox() turns a viewport into one grid_cell range per row, each an
+index range scan, and then checks the exact coordinates of the rows
+found. Works on any backend, without a spatial extension.
+"""
+import math
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+
+GRID_DEGREES = 0.05
+# Viewports spanning more rows than this scan a single range from their
+# first cell to their last instead; that many rows is most of a country
+MAX_GRID_RANGES = 64
+
+class InvalidBoundingBox(ValueError):
+    pass
+
+def grid_row(latitude, degrees=GRID_DEGREES):
+    return min(int(math.floor((float(latitude) + 90) / degrees)), round(180 / degrees) - 1)
+
+def grid_column(longitude, degrees=GRID_DEGREES):
+    return min(int(math.floor((float(longitude) + 180) / degrees)), round(360 / degrees) - 1)
+
+def grid_cell(latitude, longitude, degrees=GRID_DEGREES):
+    """
+    Number of the cell containing the coordinates on a grid of ``degrees``
+    sized cells; the map cluster grids are coarser ones.
+    """
+    if latitude is None or longitude is None:
+        return None
+    return grid_row(latitude, degrees) * round(360 / degrees) + grid_column(longitude, degrees)
+
+def parse_bbox(value):
+    """
+    Parse 'west,south,east,north' in degrees. West may be greater than east
+    for a viewport crossing the antimeridian.
+    """
+    try:
+        west, south, east, north = (Decimal(part.strip()) for part in value.split(','))
+    except (ValueError, InvalidOperation):
+        raise InvalidBoundingBox('Expected west,south,east,north in degrees')
+    if not all(part.is_finite() for part in (west, south, east, north)):
+        raise InvalidBoundingBox('Expected west,south,east,north in degrees')
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise InvalidBoundingBox('Coordinates out of range')
+    return west, south, east, north
+
+def column_spans(west, east, degrees=GRID_DEGREES):
+    if west <= east:
+        return [(grid_column(west, degrees), grid_column(east, degrees))]
+    return [(grid_column(west, degrees), round(360 / degrees) - 1), (0, grid_column(east, degrees))]
+
+def cell_ranges(west, south, east, north, field='grid_cell', degrees=GRID_DEGREES, **lookups):
+    """
+    Q matching the cells of a ``degrees`` grid stored in ``field`` that
+    overlap the bounding box: one range per grid row. ``lookups`` are
+    repeated in every range, so that an index leading with those columns
+    can serve each one.
+    """
+    columns = round(360 / degrees)
+    first_row, last_row = grid_row(south, degrees), grid_row(north, degrees)
+    spans = column_spans(west, east, degrees)
+
+    if (last_row - first_row + 1) * len(spans) > MAX_GRID_RANGES:
+        return Q(**lookups, **{f'{field}__range': (first_row * columns, (last_row + 1) * columns - 1)})
+    cells = Q()
+    for row in range(first_row, last_row + 1):
+        for first_column, last_column in spans:
+            cells |= Q(**lookups, **{f'{field}__range': (row * columns + first_column, row * columns + last_column)})
+    return cells
+
+def in_bbox(queryset, west, south, east, north):
+    """
+    Filter ``queryset`` to establishments inside the bounding box.
+    """
+    cells = cell_ranges(west, south, east, north)
+
+    if west <= east:
+        longitude = Q(longitude__gte=west, longitude__lte=east)
+    else:
+        longitude = Q(longitude__gte=west) | Q(longitude__lte=east)
+    return queryset.filter(cells, longitude, latitude__gte=south, latitude__lte=north)
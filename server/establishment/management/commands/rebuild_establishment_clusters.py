@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from establishment.clusters import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the map cluster cells from the establishments table"
+
+    def handle(self, *args, **options):
+        rows = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} cluster cells"))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('establishment', '0002_establishment_is_archived'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='establishment',
+            index=models.Index(condition=models.Q(('is_archived', False)), fields=['created_at', 'id'], name='establishment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='establishment',
+            index=models.Index(condition=models.Q(('is_archived', False)), fields=['name', 'id'], name='establishment_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='establishment',
+            index=models.Index(condition=models.Q(('is_archived', False)), fields=['city', 'id'], name='establishment_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='establishment',
+            index=models.Index(fields=['region', 'province', 'city', 'barangay'], name='establishment_location_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='establishment',
+            index=models.Index(fields=['year_established'], name='establishment_year_idx'),
+        ),
+    ]
@@ -0,0 +1,115 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:53
+
+from django.db import migrations, models
+
+# Copied from establishment.search as it was when this migration was
+# written, so later changes there do not alter what it does
+FTS_TABLE = 'establishment_establishment_fts'
+TRIGRAM_INDEX = 'establishment_search_trgm_idx'
+
+BATCH_SIZE = 1000
+
+
+def build_search_text(name, address, nature_of_business):
+    return ' '.join(part for part in (name, address, nature_of_business) if part).lower()
+
+ADDRESS_FIELDS = ('address_line', 'barangay', 'city', 'province', 'region', 'postal_code')
+
+SQLITE_CREATE = [
+    # Prefix indexes keep typeahead queries of two or three letters cheap
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        name,
+        search_text,
+        content='establishment_establishment',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON establishment_establishment BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, search_text) VALUES (new.id, new.name, new.search_text);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON establishment_establishment BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, search_text)
+        VALUES ('delete', old.id, old.name, old.search_text);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF name, search_text ON establishment_establishment BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, search_text)
+        VALUES ('delete', old.id, old.name, old.search_text);
+        INSERT INTO {FTS_TABLE}(rowid, name, search_text) VALUES (new.id, new.name, new.search_text);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def backfill_search_text(apps, schema_editor):
+    Establishment = apps.get_model('establishment', 'Establishment')
+    manager = Establishment.objects.using(schema_editor.connection.alias)
+    queryset = manager.select_related('nature_of_business')
+    batch = []
+    for establishment in queryset.order_by('id').iterator(chunk_size=BATCH_SIZE):
+        address = ", ".join(filter(None, (getattr(establishment, field) for field in ADDRESS_FIELDS)))
+        nature_of_business = establishment.nature_of_business.name if establishment.nature_of_business else ''
+        establishment.search_text = build_search_text(establishment.name, address, nature_of_business)
+        batch.append(establishment)
+        if len(batch) >= BATCH_SIZE:
+            manager.bulk_update(batch, ['search_text'])
+            batch = []
+    if batch:
+        manager.bulk_update(batch, ['search_text'])
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            if not cursor.fetchone()[0]:
+                # Searches fall back to substring filters on search_text
+                return
+        for statement in SQLITE_CREATE:
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        from django.contrib.postgres.indexes import GinIndex
+
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        Establishment = apps.get_model('establishment', 'Establishment')
+        schema_editor.add_index(Establishment, GinIndex(
+            fields=['search_text'],
+            name=TRIGRAM_INDEX,
+            opclasses=['gin_trgm_ops'],
+        ))
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in SQLITE_DROP:
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {TRIGRAM_INDEX}')
+
+
+class Migration(migrations.Migration):
+    # The search index depends on the database backend, so it is created
+    # here rather than declared in Establishment.Meta.indexes.
+
+    dependencies = [
+        ('establishment', '0003_establishment_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='establishment',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
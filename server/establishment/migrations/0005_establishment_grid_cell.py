@@ -0,0 +1,62 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:56
+
+import math
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Copied from establishment.geo as it was when this migration was written,
+# so later changes there do not alter what it does
+GRID_DEGREES = 0.05
+
+BATCH_SIZE = 1000
+
+
+def grid_row(latitude, degrees=GRID_DEGREES):
+    return min(int(math.floor((float(latitude) + 90) / degrees)), round(180 / degrees) - 1)
+
+
+def grid_column(longitude, degrees=GRID_DEGREES):
+    return min(int(math.floor((float(longitude) + 180) / degrees)), round(360 / degrees) - 1)
+
+
+def grid_cell(latitude, longitude, degrees=GRID_DEGREES):
+    if latitude is None or longitude is None:
+        return None
+    return grid_row(latitude, degrees) * round(360 / degrees) + grid_column(longitude, degrees)
+
+
+def backfill_grid_cell(apps, schema_editor):
+    Establishment = apps.get_model('establishment', 'Establishment')
+    manager = Establishment.objects.using(schema_editor.connection.alias)
+    queryset = manager.filter(latitude__isnull=False, longitude__isnull=False)
+    batch = []
+    for establishment in queryset.order_by('id').iterator(chunk_size=BATCH_SIZE):
+        establishment.grid_cell = grid_cell(establishment.latitude, establishment.longitude)
+        batch.append(establishment)
+        if len(batch) >= BATCH_SIZE:
+            manager.bulk_update(batch, ['grid_cell'])
+            batch = []
+    if batch:
+        manager.bulk_update(batch, ['grid_cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('establishment', '0004_establishment_search_text'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='establishment',
+            name='grid_cell',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_grid_cell, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='establishment',
+            index=models.Index(fields=['grid_cell', 'latitude', 'longitude'], name='establishment_grid_idx'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:59
+
+import math
+from collections import defaultdict
+
+from django.db import migrations, models
+
+# Copied from establishment.clusters and establishment.geo as they were when
+# this migration was written, so later changes there do not alter what it
+# does
+CLUSTER_MIN_ZOOM = 4
+CLUSTER_MAX_ZOOM = 14
+CELLS_PER_TILE = 4
+
+BATCH_SIZE = 1000
+
+
+def cell_degrees(zoom):
+    return 360 / 2 ** zoom / CELLS_PER_TILE
+
+
+def grid_cell(latitude, longitude, degrees):
+    row = min(int(math.floor((latitude + 90) / degrees)), round(180 / degrees) - 1)
+    column = min(int(math.floor((longitude + 180) / degrees)), round(360 / degrees) - 1)
+    return row * round(360 / degrees) + column
+
+
+def populate_cluster_cells(apps, schema_editor):
+    Establishment = apps.get_model('establishment', 'Establishment')
+    ClusterCell = apps.get_model('establishment', 'ClusterCell')
+    alias = schema_editor.connection.alias
+    places = [
+        (float(latitude), float(longitude), nature_of_business_id or 0)
+        for latitude, longitude, nature_of_business_id in Establishment.objects.using(alias)
+        .filter(is_archived=False, latitude__isnull=False, longitude__isnull=False)
+        .values_list('latitude', 'longitude', 'nature_of_business_id')
+        .iterator(chunk_size=BATCH_SIZE)
+    ]
+    # A zoom at a time, so only one level's cells are in memory
+    for zoom in range(CLUSTER_MIN_ZOOM, CLUSTER_MAX_ZOOM + 1):
+        degrees = cell_degrees(zoom)
+        cells = defaultdict(lambda: (0, 0.0, 0.0))
+        for latitude, longitude, nature_of_business_id in places:
+            key = (grid_cell(latitude, longitude, degrees), nature_of_business_id)
+            count, latitude_sum, longitude_sum = cells[key]
+            cells[key] = (count + 1, latitude_sum + latitude, longitude_sum + longitude)
+        ClusterCell.objects.using(alias).bulk_create(
+            [
+                ClusterCell(
+                    zoom=zoom, cell=cell, nature_of_business_id=nature_of_business_id,
+                    count=count, latitude_sum=latitude_sum, longitude_sum=longitude_sum,
+                )
+                for (cell, nature_of_business_id), (count, latitude_sum, longitude_sum) in cells.items()
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('establishment', '0005_establishment_grid_cell'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClusterCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zoom', models.PositiveSmallIntegerField()),
+                ('cell', models.BigIntegerField()),
+                ('nature_of_business_id', models.BigIntegerField(default=0)),
+                ('count', models.IntegerField(default=0)),
+                ('latitude_sum', models.FloatField(default=0)),
+                ('longitude_sum', models.FloatField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Cluster Cell',
+                'verbose_name_plural': 'Cluster Cells',
+                'constraints': [models.UniqueConstraint(fields=('zoom', 'cell', 'nature_of_business_id'), name='cluster_cell_unique')],
+            },
+        ),
+        migrations.RunPython(populate_cluster_cells, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,11 @@
 from django.db import models
+from django.db.models import Q
 from base.models import User
 from django.utils import timezone
 
+from .geo import grid_cell
+from .search import build_search_text
+
 class NatureOfBusiness(models.Model):
     name = models.CharField(max_length=50, unique=True, verbose_name="Business Nature")
     description = models.TextField(blank=True, null=True, verbose_name="Description")
@@ -16,6 +20,32 @@ class NatureOfBusiness(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # The name is part of its establishments' search text; a new one
+        # has no establishments yet
+        name_changed = not self._state.adding and self.name != (
+            NatureOfBusiness.objects.filter(pk=self.pk).values_list('name', flat=True).first()
+        )
+        super().save(*args, **kwargs)
+        if name_changed:
+            refresh_search_text(self.establishments.all())
+
+    def delete(self, *args, **kwargs):
+        establishments = list(self.establishments.values_list('pk', flat=True))
+        result = super().delete(*args, **kwargs)
+        refresh_search_text(Establishment.objects.filter(pk__in=establishments))
+        return result
+
+def refresh_search_text(establishments):
+    """
+    Rebuild search_text for ``establishments`` without going through save().
+    """
+    batch = []
+    for establishment in establishments.select_related('nature_of_business').iterator(chunk_size=500):
+        establishment.populate_search_text()
+        batch.append(establishment)
+    Establishment.objects.bulk_update(batch, ['search_text'], batch_size=500)
+
 class Establishment(models.Model):
     name = models.CharField(max_length=255, verbose_name="Establishment Name")
     owner = models.ForeignKey(
@@ -64,7 +94,11 @@ class Establishment(models.Model):
         blank=True,
         verbose_name="Longitude"
     )
+    # Map grid cell of the coordinates; see geo.py
+    grid_cell = models.BigIntegerField(null=True, blank=True, editable=False)
     is_archived = models.BooleanField(default=False)
+    # Name, address and nature of business for search; see search.py
+    search_text = models.TextField(blank=True, default='', editable=False)
     created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -72,10 +106,41 @@ class Establishment(models.Model):
         ordering = ['-created_at']
         verbose_name = "Establishment"
         verbose_name_plural = "Establishments"
+        indexes = [
+            # One per list ordering. Partial over the active rows, which every
+            # default listing filters on; the id tiebreaker gives keyset
+            # pagination a unique position to continue from.
+            models.Index(fields=['created_at', 'id'], name='establishment_created_idx', condition=Q(is_archived=False)),
+            models.Index(fields=['name', 'id'], name='establishment_name_idx', condition=Q(is_archived=False)),
+            models.Index(fields=['city', 'id'], name='establishment_city_idx', condition=Q(is_archived=False)),
+            models.Index(fields=['region', 'province', 'city', 'barangay'], name='establishment_location_idx'),
+            models.Index(fields=['year_established'], name='establishment_year_idx'),
+            # Map viewports: a grid_cell range per row, with the coordinates
+            # in the index for the exact bounding box check. Not partial:
+            # SQLite only splits an OR of ranges into separate index
+            # searches on an index without a condition.
+            models.Index(fields=['grid_cell', 'latitude', 'longitude'], name='establishment_grid_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the database holds, so a save can tell what it changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def populate_search_text(self):
+        nature_of_business = self.nature_of_business.name if self.nature_of_business else ''
+        self.search_text = build_search_text(self.name, self.full_address, nature_of_business)
+
+    def save(self, *args, **kwargs):
+        self.populate_search_text()
+        self.grid_cell = grid_cell(self.latitude, self.longitude)
+        super().save(*args, **kwargs)
+
     @property
     def full_address(self):
         address_parts = [
@@ -126,4 +191,33 @@ class EstablishmentPolygon(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"Polygon for {self.establishment.name}"
\ No newline at end of file
+        return f"Polygon for {self.establishment.name}"
+
+class ClusterCell(models.Model):
+    """
+    Active establishments counted per map zoom level, grid cell of that
+    zoom and nature of business, with the sums of their coordinates for the
+    cluster centroid; kept up to date as establishments are saved
+    (establishment/clusters.py). The nature of business is a plain id,
+    0 for none.
+    """
+    zoom = models.PositiveSmallIntegerField()
+    cell = models.BigIntegerField()
+    nature_of_business_id = models.BigIntegerField(default=0)
+    count = models.IntegerField(default=0)
+    latitude_sum = models.FloatField(default=0)
+    longitude_sum = models.FloatField(default=0)
+
+    class Meta:
+        verbose_name = "Cluster Cell"
+        verbose_name_plural = "Cluster Cells"
+        constraints = [
+            # Its index also serves the viewport query, cell ranges per zoom
+            models.UniqueConstraint(
+                fields=['zoom', 'cell', 'nature_of_business_id'],
+                name='cluster_cell_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Zoom {self.zoom} cell {self.cell}: {self.count}"
@@ -0,0 +1,64 @@
+"""
+Ranked search over establishments.
+
+Establishment.search_text holds the lower-cased name, full address and
+nature of business, rebuilt whenever one of them changes. It is indexed
+according to the database:
+
+    sqlite      an FTS5 table over (name, search_text) kept in sync by
+                triggers, ranked with bm25() so that a hit in the name
+                counts most
+    postgresql  a pg_trgm GIN index on search_text, which serves the
+                substring filter; ranked by trigram word similarity
+    other       a plain substring filter, unranked
+
+The index itself is created by migration 0004.
+"""
+from django.db import connections
+
+from base.fts import fts5_query, has_fts5_table, unranked
+
+FTS_TABLE = 'establishment_establishment_fts'
+TRIGRAM_INDEX = 'establishment_search_trgm_idx'
+# How much more a match in the name counts than one elsewhere
+NAME_WEIGHT = 10.0
+
+def build_search_text(name, address, nature_of_business):
+    return ' '.join(part for part in (name, address, nature_of_business) if part).lower()
+
+def search(queryset, text):
+    """
+    Filter ``queryset`` to establishments matching every term of ``text``,
+    annotated with ``search_rank`` (higher is better).
+    """
+    connection = connections[queryset.db]
+
+    if connection.vendor == 'sqlite' and has_fts5_table(connection, FTS_TABLE):
+        query = fts5_query(text)
+        if not query:
+            return unranked(queryset.none())
+        table = queryset.model._meta.db_table
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[query],
+            # bm25() is lower for better matches
+            select={'search_rank': f'-bm25({FTS_TABLE}, {NAME_WEIGHT}, 1.0)'},
+        )
+
+    terms = text.lower().split()
+    if not terms:
+        return unranked(queryset.none())
+    for term in terms:
+        queryset = queryset.filter(search_text__contains=term)
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        text = ' '.join(terms)
+        return queryset.annotate(
+            search_rank=TrigramWordSimilarity(text, 'name') * NAME_WEIGHT
+            + TrigramWordSimilarity(text, 'search_text')
+        )
+
+    return unranked(queryset)
@@ -1,3 +1,174 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from base.models import User
+from base.pagination import encode_cursor
+from .models import Establishment, EstablishmentPolygon, NatureOfBusiness
+
+class EstablishmentQueryBudgetTests(TestCase):
+    """
+    Each endpoint runs a fixed number of queries however many establishments
+    it returns, so nested serializers cannot reintroduce N+1 queries.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='budget@example.com',
+            username='budget@example.com',
+            password='password',
+            first_name='Query',
+            last_name='Budget',
+        )
+        cls.nature = NatureOfBusiness.objects.create(name='Manufacturing')
+
+    def setUp(self):
+        self.client = APIClient()
+        # No session or token lookups in the counted queries
+        self.client.force_authenticate(self.user)
+
+    def create_establishments(self, count, **fields):
+        establishments = []
+        for i in range(count):
+            establishment = Establishment.objects.create(
+                name=f'Establishment {i}',
+                address_line='1 Main Street',
+                barangay='Poblacion',
+                city='Sample City',
+                province='Sample Province',
+                region='Sample Region',
+                nature_of_business=self.nature,
+                **fields,
+            )
+            EstablishmentPolygon.objects.create(
+                establishment=establishment,
+                coordinates=[[[121.0, 14.0], [121.1, 14.0], [121.1, 14.1], [121.0, 14.0]]],
+            )
+            establishments.append(establishment)
+        return establishments
+
+    def assertListBudget(self, params, budget):
+        for count in (1, 10):
+            Establishment.objects.all().delete()
+            self.create_establishments(count)
+            with self.assertNumQueries(budget):
+                response = self.client.get('/api/establishment/establishments/', params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['data']), count)
+
+    def test_list(self):
+        self.assertListBudget({}, 1)
+
+    def test_list_page(self):
+        self.assertListBudget({'cursor': ''}, 1)
+
+    def test_list_archived(self):
+        for count in (1, 10):
+            Establishment.objects.all().delete()
+            Establishment.objects.filter(
+                pk__in=[e.pk for e in self.create_establishments(count)]
+            ).update(is_archived=True)
+            with self.assertNumQueries(1):
+                response = self.client.get('/api/establishment/establishments/', {'show_archived': 'true'})
+            self.assertEqual(len(response.json()['data']), count)
+
+    def test_retrieve(self):
+        establishment, = self.create_establishments(1)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/establishment/establishments/{establishment.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['polygon']['establishment'], establishment.name)
+
+    def test_archive(self):
+        establishment, = self.create_establishments(1)
+        # Fetch and update
+        with self.assertNumQueries(2):
+            response = self.client.post(f'/api/establishment/establishments/{establishment.pk}/archive/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['data']['is_archived'])
+
+    def test_unarchive(self):
+        establishment, = self.create_establishments(1)
+        Establishment.objects.filter(pk=establishment.pk).update(is_archived=True)
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                f'/api/establishment/establishments/{establishment.pk}/unarchive/?show_archived=true'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['data']['is_archived'])
+
+    def test_polygon_list(self):
+        self.create_establishments(10)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/establishment/polygons/')
+        self.assertEqual(len(response.json()), 10)
+
+    def test_clusters(self):
+        # The cells and the nature of business names
+        for count in (1, 10):
+            Establishment.objects.all().delete()
+            self.create_establishments(count, latitude='14.6', longitude='121.0')
+            with self.assertNumQueries(2):
+                response = self.client.get(
+                    '/api/establishment/establishments/clusters/', {'bbox': '120,14,122,15', 'zoom': 8}
+                )
+            self.assertEqual(sum(cluster['count'] for cluster in response.json()['data']), count)
+
+class EstablishmentListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='list@example.com',
+            username='list@example.com',
+            password='password',
+            first_name='List',
+            last_name='User',
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_forged_cursor(self):
+        # Well-formed tokens whose values do not fit (created_at, id)
+        for values in (['x', 'abc'], ['x', [1]], [{}, 1]):
+            response = self.client.get('/api/establishment/establishments/', {'cursor': encode_cursor(values)})
+            self.assertEqual(response.status_code, 400, values)
+            self.assertEqual(response.json()['errors'], {'cursor': ['Invalid cursor']})
+
+    def test_out_of_range_filter(self):
+        for param in ('year_from', 'year_to', 'owner', 'nature_of_business'):
+            for value in ('9' * 30, '-1', 'abc'):
+                response = self.client.get('/api/establishment/establishments/', {param: value})
+                self.assertEqual(response.status_code, 400, (param, value))
+                self.assertEqual(response.json()['errors'], {param: ['A whole number is required.']})
+
+class NatureOfBusinessSearchTextTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='nature@example.com',
+            username='nature@example.com',
+            password='password',
+            first_name='Nature',
+            last_name='User',
+        )
+
+    def test_rename_refreshes_search_text(self):
+        nature = NatureOfBusiness.objects.create(name='Bakery')
+        establishment = Establishment.objects.create(
+            name='Corner Shop', owner=self.user, nature_of_business=nature,
+        )
+        nature.name = 'Pastry'
+        nature.save()
+        establishment.refresh_from_db()
+        self.assertIn('pastry', establishment.search_text)
+        self.assertNotIn('bakery', establishment.search_text)
+
+    def test_save_without_rename(self):
+        nature = NatureOfBusiness.objects.create(name='Bakery')
+        Establishment.objects.create(name='Corner Shop', owner=self.user, nature_of_business=nature)
+        nature.description = 'Bread and cakes'
+        # Reading the stored name and the update, no establishments
+        with self.assertNumQueries(2):
+            nature.save()
@@ -5,11 +5,78 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from django.http import Http404
 
+from base.pagination import InvalidCursor, KeysetPaginator, parse_page_size
+from .clusters import CLUSTER_MAX_ZOOM, CLUSTER_MIN_ZOOM, viewport_clusters
+from .geo import InvalidBoundingBox, in_bbox, parse_bbox
 from .models import Establishment, NatureOfBusiness, EstablishmentPolygon
+from .search import search
 from .serializers import (EstablishmentSerializer, 
                          NatureOfBusinessSerializer,
                          EstablishmentPolygonSerializer)
 
+# ?ordering= values and the keyset each one paginates by; every pair is
+# covered by an index in Establishment.Meta
+ORDERINGS = {
+    'created_at': ('created_at', 'id'),
+    '-created_at': ('-created_at', '-id'),
+    'name': ('name', 'id'),
+    '-name': ('-name', '-id'),
+    'city': ('city', 'id'),
+    '-city': ('-city', '-id'),
+}
+DEFAULT_ORDERING = '-created_at'
+
+# Markers a single viewport returns; past that the map should cluster
+VIEWPORT_LIMIT = 1000
+
+TYPEAHEAD_LIMIT = 10
+TYPEAHEAD_MIN_LENGTH = 2
+TYPEAHEAD_FIELDS = (
+    'id', 'name', 'address_line', 'barangay', 'city', 'province', 'region',
+    'postal_code', 'nature_of_business__name',
+)
+
+# Matched exactly, as picked from the address dropdowns, so they can use
+# establishment_location_idx
+LOCATION_FILTERS = ('region', 'province', 'city', 'barangay')
+
+NUMBER_FILTERS = {
+    'nature_of_business': 'nature_of_business_id',
+    'owner': 'owner_id',
+    'year_from': 'year_established__gte',
+    'year_to': 'year_established__lte',
+}
+# Largest value a 64-bit integer column can be compared with; databases
+# raise rather than match nothing beyond it
+MAX_NUMBER_FILTER = 2 ** 63 - 1
+
+def filter_establishments(queryset, params):
+    """
+    Apply the list filters in ``params``. Raises ValidationError for
+    numeric filters that are not whole numbers.
+    """
+    for field in LOCATION_FILTERS:
+        value = params.get(field, '').strip()
+        if value:
+            queryset = queryset.filter(**{field: value})
+
+    errors = {}
+    for param, lookup in NUMBER_FILTERS.items():
+        value = params.get(param, '').strip()
+        if not value:
+            continue
+        try:
+            number = int(value)
+        except ValueError:
+            number = None
+        if number is None or not 0 <= number <= MAX_NUMBER_FILTER:
+            errors[param] = ['A whole number is required.']
+            continue
+        queryset = queryset.filter(**{lookup: number})
+    if errors:
+        raise ValidationError(errors)
+    return queryset
+
 class NatureOfBusinessViewSet(viewsets.ModelViewSet):
     queryset = NatureOfBusiness.objects.all()
     serializer_class = NatureOfBusinessSerializer
@@ -24,7 +91,7 @@ class NatureOfBusinessViewSet(viewsets.ModelViewSet):
         })
 
 class EstablishmentPolygonViewSet(viewsets.ModelViewSet):
-    queryset = EstablishmentPolygon.objects.all()
+    queryset = EstablishmentPolygon.objects.select_related('establishment')
     serializer_class = EstablishmentPolygonSerializer
 
     def create(self, request, *args, **kwargs):
@@ -51,21 +118,69 @@ class EstablishmentPolygonViewSet(viewsets.ModelViewSet):
             )
 
 class EstablishmentViewSet(viewsets.ModelViewSet):
-    queryset = Establishment.objects.filter(is_archived=False)
+    # Everything EstablishmentSerializer nests comes in the same query
+    queryset = Establishment.objects.select_related('nature_of_business', 'polygon')
     serializer_class = EstablishmentSerializer
     
     def get_queryset(self):
         queryset = super().get_queryset()
         if self.request.query_params.get('show_archived') == 'true':
-            queryset = Establishment.objects.filter(is_archived=True)
-        return queryset
+            return queryset.filter(is_archived=True)
+        return queryset.filter(is_archived=False)
     
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
+        params = request.query_params
+        text = params.get('search', '').strip()
+        ordering = params.get('ordering', DEFAULT_ORDERING)
+        try:
+            if ordering not in ORDERINGS:
+                raise ValidationError({'ordering': [f"Must be one of: {', '.join(ORDERINGS)}."]})
+            queryset = filter_establishments(self.filter_queryset(self.get_queryset()), params)
+            if text:
+                queryset = search(queryset, text)
+        except ValidationError as exc:
+            return Response(
+                {
+                    'status': 'error',
+                    'errors': exc.detail
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if 'cursor' not in params:
+            # Without ?cursor= the whole filtered list, for existing clients.
+            # Search results come best match first unless ordered otherwise;
+            # keyset pages cannot continue from a rank, so they always
+            # follow ?ordering=.
+            if text and 'ordering' not in params:
+                queryset = queryset.order_by('-search_rank', '-id')
+            else:
+                queryset = queryset.order_by(*ORDERINGS[ordering])
+            serializer = self.get_serializer(queryset, many=True)
+            return Response({
+                'status': 'success',
+                'data': serializer.data
+            })
+
+        # Keyset mode: ?cursor= for the first page, then the returned tokens
+        paginator = KeysetPaginator(queryset, ORDERINGS[ordering], parse_page_size(params.get('page_size')))
+        try:
+            establishments, next_cursor, previous_cursor = paginator.page(params['cursor'])
+        except InvalidCursor:
+            return Response(
+                {
+                    'status': 'error',
+                    'errors': {'cursor': ['Invalid cursor']}
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = self.get_serializer(establishments, many=True)
         return Response({
             'status': 'success',
-            'data': serializer.data
+            'data': serializer.data,
+            'next': next_cursor,
+            'previous': previous_cursor,
+            'page_size': paginator.page_size
         })
     
     def retrieve(self, request, *args, **kwargs):
@@ -122,6 +237,111 @@ class EstablishmentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
     
+    @action(detail=False, methods=['get'])
+    def typeahead(self, request):
+        """
+        Best matches for a partial name or address, for pickers that
+        query on every keystroke: no nested serializers, at most
+        TYPEAHEAD_LIMIT active establishments.
+        """
+        text = request.query_params.get('q', '').strip()
+        if len(text) < TYPEAHEAD_MIN_LENGTH:
+            return Response({
+                'status': 'success',
+                'data': []
+            })
+        rows = (
+            search(Establishment.objects.filter(is_archived=False), text)
+            .order_by('-search_rank', '-id')
+            .values(*TYPEAHEAD_FIELDS)[:TYPEAHEAD_LIMIT]
+        )
+        return Response({
+            'status': 'success',
+            'data': [
+                {
+                    'id': row['id'],
+                    'name': row['name'],
+                    'address': ", ".join(filter(None, (
+                        row['address_line'], row['barangay'], row['city'],
+                        row['province'], row['region'], row['postal_code']
+                    ))),
+                    'nature_of_business': row['nature_of_business__name'],
+                }
+                for row in rows
+            ]
+        })
+    
+    @action(detail=False, methods=['get'])
+    def viewport(self, request):
+        """
+        Active establishments inside ?bbox=west,south,east,north, with the
+        list filters. At most VIEWPORT_LIMIT of them; 'truncated' says
+        whether there were more.
+        """
+        try:
+            west, south, east, north = parse_bbox(request.query_params.get('bbox', ''))
+            queryset = filter_establishments(self.get_queryset(), request.query_params)
+        except InvalidBoundingBox as exc:
+            return Response(
+                {
+                    'status': 'error',
+                    'errors': {'bbox': [str(exc)]}
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except ValidationError as exc:
+            return Response(
+                {
+                    'status': 'error',
+                    'errors': exc.detail
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Unordered, so the scan can stop at the limit
+        establishments = list(in_bbox(queryset, west, south, east, north).order_by()[:VIEWPORT_LIMIT + 1])
+        serializer = self.get_serializer(establishments[:VIEWPORT_LIMIT], many=True)
+        return Response({
+            'status': 'success',
+            'data': serializer.data,
+            'truncated': len(establishments) > VIEWPORT_LIMIT
+        })
+    
+    @action(detail=False, methods=['get'])
+    def clusters(self, request):
+        """
+        Precomputed marker clusters for ?bbox=west,south,east,north at
+        ?zoom=, clamped to the zoom levels that are kept. Beyond the last
+        one the map should show the viewport's markers instead.
+        """
+        try:
+            west, south, east, north = parse_bbox(request.query_params.get('bbox', ''))
+        except InvalidBoundingBox as exc:
+            return Response(
+                {
+                    'status': 'error',
+                    'errors': {'bbox': [str(exc)]}
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            zoom = int(request.query_params.get('zoom', ''))
+        except ValueError:
+            return Response(
+                {
+                    'status': 'error',
+                    'errors': {'zoom': ['A whole number is required.']}
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        zoom = max(CLUSTER_MIN_ZOOM, min(zoom, CLUSTER_MAX_ZOOM))
+        return Response({
+            'status': 'success',
+            'data': viewport_clusters(west, south, east, north, zoom),
+            'zoom': zoom
+        })
+    
     @action(detail=True, methods=['post'])
     def archive(self, request, pk=None):
         establishment = self.get_object()